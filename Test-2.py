@@ -5,7 +5,12 @@ Creates a PDF report using fpdf.
 Dependencies:
  - Python 3.8+
  - fpdf (pip install fpdf)
- - pillow (optional, for logo) (pip install pillow)
+ - pillow (pip install pillow) - photo attachments
+
+Inspections are also queued in reports/outbox.jsonl and, when PPI_SYNC_URL
+points at the central server (app.py), sent to it in the background. Saving
+never waits on the network; queued inspections go out once it is reachable.
+Inspections the server refuses are reported and kept in outbox.jsonl.rejected.
 
 How to use:
  - Run: python pre_purchase_inspection.py
@@ -16,80 +21,51 @@ This is a single-file app intended to be easy to customize for your shop.
 """
 
 import os
-import datetime
+import queue
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, filedialog
-from fpdf import FPDF
+
+from checklists import get_catalog
+from inspection import new_record, report_filename, write_ppi_csv
+from inspection_store import get_store
+from outbox import Outbox, OutboxSync
+from photo_store import get_photo_store
 
 # ---------------------- Configuration ----------------------
-SHOP_NAME = "AUTO MAZEN"
-SHOP_ADDRESS = "Dawhat Aramoun/Main Street"
-SHOP_PHONE = "03 419 833"
-LOGO_PATH = "logo.jpeg"  # hardcoded logo file
+# Checklist items, recommendations and branding come from the templates in checklists.json
+TEMPLATE_ID = "car"  # vehicle class selected when the app starts
 REPORTS_DIR = "reports"
-
-if not os.path.exists(REPORTS_DIR):
-    os.makedirs(REPORTS_DIR)
-
-CHECK_ITEMS = [
-    "Engine - Visual & Oil Leaks",
-    "Engine - Compression / Idle / Noises",
-    "Engine - Belts & Hoses",
-    "Fluids - Oil / Coolant / Transmission",
-    "Drivetrain - Axles / CV Joints",
-    "Emission - Catalytic Converter",
-    "Scratch & Dent Check",
-    "Transmission / Clutch",
-    "Brakes - Pads / Rotors / Fluid",
-    "Suspension & Steering",
-    "Tires - Tread & Pressure",
-    "Exhaust System",
-    "Cooling System - Radiator / Hoses",
-    "Battery & Charging System",
-    "Lights & Electrical",
-    "Air Conditioning / Heating",
-    "Interior - Seats / Electronics",
-    "Body - Rust / Paint / Panels",
-    "Frame & Underbody",
-    "Test Drive - Noise / Vibration / Handling",
-]
-
-RECOMMENDATIONS = [
-    "Buy as-is",
-    "Negotiate price (minor issues)",
-    "Get major repairs before buying",
-    "Avoid purchase - too risky",
-]
-
-# ---------------------- PDF Helper ----------------------
-class InspectionPDF(FPDF):
-    def header(self):
-        # Add shop name and logo
-        if LOGO_PATH and os.path.exists(LOGO_PATH):
-            try:
-                self.image(LOGO_PATH, 10, 8, 30)  # adjusted size
-            except Exception:
-                pass
-        self.set_font('Arial', 'B', 14)
-        self.cell(0, 6, SHOP_NAME, ln=True, align='R')
-        self.set_font('Arial', '', 9)
-        self.cell(0, 5, SHOP_ADDRESS + (' | ' + SHOP_PHONE if SHOP_PHONE else ''), ln=True, align='R')
-        self.ln(4)
-
-    def footer(self):
-        self.set_y(-20)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 5, f'Report generated: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}', ln=True, align='L')
-        self.cell(0, 5, 'Thank you for choosing ' + SHOP_NAME, ln=True, align='R')
+DB_PATH = os.path.join(REPORTS_DIR, "inspections.db")
+POLL_MS = 100  # how often the UI picks up finished background work
+OUTBOX_PATH = os.path.join(REPORTS_DIR, "outbox.jsonl")
+SYNC_URL = os.environ.get("PPI_SYNC_URL", "")  # central server; empty keeps inspections local
 
 # ---------------------- App GUI ----------------------
 class PPIApp:
     def __init__(self, root):
         self.root = root
         self.root.title('Pre-Purchase Vehicle Inspection')
-        self.root.geometry('920x640')
+        self.root.geometry('1000x640')
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+
+        # Reports and CSVs are written by a background worker so the form stays
+        # responsive; results come back through self.results and poll_results().
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.pending = []  # (future, cancel event)
+
+        # Saved inspections are journaled locally and sent to the server in batches
+        self.outbox = Outbox(OUTBOX_PATH)
+        self.rejected_seen = self.outbox.rejected  # refused inspections the user has been told about
+        self.sync = OutboxSync(self.outbox, SYNC_URL, get_photo_store()) if SYNC_URL else None
+        if self.sync:
+            self.sync.start()
 
         self.create_widgets()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        self.root.after(POLL_MS, self.poll_results)
 
     def create_widgets(self):
         frm = ttk.Frame(self.root, padding=10)
@@ -131,6 +107,12 @@ class PPIApp:
         self.vehicle_vin = ttk.Entry(right, width=30)
         self.vehicle_vin.grid(row=2, column=1, padx=5, pady=2)
 
+        ttk.Label(right, text='Vehicle Type:').grid(row=3, column=0, sticky='w')
+        self.template_var = tk.StringVar()
+        self.template_cb = ttk.Combobox(right, textvariable=self.template_var, width=27, state='readonly')
+        self.template_cb.grid(row=3, column=1, padx=5, pady=2)
+        self.template_cb.bind('<<ComboboxSelected>>', lambda e: self.set_template(self.template_ids[self.template_cb.current()]))
+
         # Middle: Checklist area (scrollable)
         mid = ttk.LabelFrame(frm, text='Inspection Checklist')
         mid.pack(fill='both', expand=True, pady=10)
@@ -150,19 +132,9 @@ class PPIApp:
         canvas.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
 
-        # Build checklist rows
         self.check_vars = []  # list of (StringVar for status, Entry for notes, Entry for cost)
-        for i, item in enumerate(CHECK_ITEMS):
-            ttk.Label(self.checklist_frame, text=item).grid(row=i, column=0, sticky='w', padx=6, pady=4)
-            status = tk.StringVar(value='Pass')
-            cb = ttk.Combobox(self.checklist_frame, textvariable=status, values=['Pass', 'Minor', 'Major'], width=10, state='readonly')
-            cb.grid(row=i, column=1, padx=6)
-            notes = ttk.Entry(self.checklist_frame, width=50)
-            notes.grid(row=i, column=2, padx=6)
-            cost = ttk.Entry(self.checklist_frame, width=12)
-            cost.insert(0, '0')
-            cost.grid(row=i, column=3, padx=6)
-            self.check_vars.append((item, status, notes, cost))
+        self.photo_paths = []  # per checklist row: image files to attach
+        self.photo_buttons = []
 
         # Bottom: summary, recommendation and buttons
         bottom = ttk.Frame(frm)
@@ -173,9 +145,9 @@ class PPIApp:
         self.summary_text.grid(row=0, column=1, columnspan=3, padx=6, pady=6, sticky='we')
 
         ttk.Label(bottom, text='Recommendation:').grid(row=1, column=0, sticky='w')
-        self.recommend_var = tk.StringVar(value=RECOMMENDATIONS[0])
-        recommend_cb = ttk.Combobox(bottom, textvariable=self.recommend_var, values=RECOMMENDATIONS, state='readonly')
-        recommend_cb.grid(row=1, column=1, padx=6, sticky='w')
+        self.recommend_var = tk.StringVar()
+        self.recommend_cb = ttk.Combobox(bottom, textvariable=self.recommend_var, state='readonly')
+        self.recommend_cb.grid(row=1, column=1, padx=6, sticky='w')
 
         ttk.Label(bottom, text='Estimated Total Repair Cost:').grid(row=1, column=2, sticky='e')
         self.total_cost_var = tk.StringVar(value='0')
@@ -194,15 +166,94 @@ class PPIApp:
         clear_btn = ttk.Button(btn_frame, text='Clear Form', command=self.clear_form)
         clear_btn.pack(side='left', padx=6)
 
-    def calculate_total_from_items(self):
-        total = 0.0
-        for _, _, _, cost_entry in self.check_vars:
-            try:
-                v = float(cost_entry.get() or 0)
-            except ValueError:
-                v = 0.0
-            total += v
-        return total
+        # Background work indicator
+        self.cancel_btn = ttk.Button(btn_frame, text='Cancel', command=self.cancel_background, state='disabled')
+        self.cancel_btn.pack(side='right', padx=6)
+        self.progress = ttk.Progressbar(btn_frame, mode='indeterminate', length=120)
+        self.progress.pack(side='right', padx=6)
+        self.status_var = tk.StringVar(value='')
+        ttk.Label(btn_frame, textvariable=self.status_var).pack(side='right', padx=6)
+        self.sync_var = tk.StringVar(value='')
+        ttk.Label(btn_frame, textvariable=self.sync_var).pack(side='right', padx=6)
+
+        self.set_template(TEMPLATE_ID)
+
+    def set_template(self, template_id):
+        # Rebuilds the checklist from the current templates, so edits to
+        # checklists.json show up the next time a form is started
+        catalog = get_catalog()
+        self.template = catalog.get(template_id)
+        self.template_ids = list(catalog.templates)
+        self.template_cb.configure(values=[t.name for t in catalog.templates.values()])
+        self.template_var.set(self.template.name)
+        self.recommend_cb.configure(values=self.template.recommendations)
+        self.recommend_var.set(self.template.recommendations[0])
+
+        for widget in self.checklist_frame.winfo_children():
+            widget.destroy()
+        self.check_vars, self.photo_paths, self.photo_buttons = [], [], []
+        grid_row = 0
+        for category in self.template.categories:
+            ttk.Label(self.checklist_frame, text=category.name, font=('TkDefaultFont', 10, 'bold')).grid(
+                row=grid_row, column=0, sticky='w', padx=6, pady=(8, 2))
+            grid_row += 1
+            for item in category.items:
+                i = len(self.check_vars)
+                ttk.Label(self.checklist_frame, text=item).grid(row=grid_row, column=0, sticky='w', padx=6, pady=4)
+                status = tk.StringVar(value='Pass')
+                cb = ttk.Combobox(self.checklist_frame, textvariable=status, values=['Pass', 'Minor', 'Major'], width=10, state='readonly')
+                cb.grid(row=grid_row, column=1, padx=6)
+                notes = ttk.Entry(self.checklist_frame, width=50)
+                notes.grid(row=grid_row, column=2, padx=6)
+                cost = ttk.Entry(self.checklist_frame, width=12)
+                cost.insert(0, '0')
+                cost.grid(row=grid_row, column=3, padx=6)
+                photos_btn = ttk.Button(self.checklist_frame, text='Photos (0)', command=lambda i=i: self.choose_photos(i))
+                photos_btn.grid(row=grid_row, column=4, padx=6)
+                self.check_vars.append((item, status, notes, cost))
+                self.photo_paths.append([])
+                self.photo_buttons.append(photos_btn)
+                grid_row += 1
+
+    def collect_record(self):
+        return new_record(
+            client_name=self.client_name.get(),
+            client_phone=self.client_phone.get(),
+            inspector=self.inspector.get(),
+            vehicle_model=self.vehicle_model.get(),
+            vehicle_year=self.vehicle_year.get(),
+            vehicle_vin=self.vehicle_vin.get(),
+            items=[(item, status_var.get(), notes_entry.get(), cost_entry.get())
+                   for item, status_var, notes_entry, cost_entry in self.check_vars],
+            summary=self.summary_text.get('1.0', 'end').strip(),
+            recommendation=self.recommend_var.get(),
+            total_cost=self.total_cost_var.get(),
+            template=self.template.key,
+        )
+
+    def choose_photos(self, row):
+        paths = filedialog.askopenfilenames(
+            title=f'Photos for {self.check_vars[row][0]}',
+            filetypes=[('Images', '*.jpg *.jpeg *.png *.webp'), ('All files', '*.*')])
+        if paths:
+            self.photo_paths[row] = list(paths)
+            self.photo_buttons[row].configure(text=f'Photos ({len(paths)})')
+
+    @staticmethod
+    def attach_photos(record, photo_paths):
+        # Worker thread: originals are copied into the photo store, which
+        # starts making the print thumbnails right away
+        store = get_photo_store()
+        for item, paths in zip(record['items'], photo_paths):
+            if paths:
+                item['photos'] = [store.add_file(p) for p in paths]
+
+    def store_record(self, record):
+        # Worker thread: the local database and the outbox, never the network
+        get_store(DB_PATH).add(record, source='desktop')
+        self.outbox.append(record)
+        if self.sync:
+            self.sync.wake()
 
     def generate_report(self):
         # Basic validation
@@ -210,109 +261,125 @@ class PPIApp:
             if not messagebox.askyesno('Confirm', 'Client name is empty. Continue?'):
                 return
 
-        total_from_items = self.calculate_total_from_items()
-        try:
-            manual_total = float(self.total_cost_var.get() or 0)
-        except ValueError:
-            manual_total = 0
-        # If manual_total is zero, use calculated
-        final_total = manual_total if manual_total > 0 else total_from_items
-
-        # Create PDF
-        pdf = InspectionPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 8, 'Pre-Purchase Vehicle Inspection Report', ln=True, align='C')
-        pdf.ln(4)
-
-        # Client & vehicle block
-        pdf.set_font('Arial', '', 10)
-        pdf.cell(40, 6, f'Client: {self.client_name.get()}', ln=0)
-        pdf.cell(0, 6, f'Date: {datetime.datetime.now().strftime("%Y-%m-%d")}', ln=1)
-        pdf.cell(40, 6, f'Phone: {self.client_phone.get()}', ln=0)
-        pdf.cell(0, 6, f'Inspector: {self.inspector.get()}', ln=1)
-        pdf.cell(80, 6, f'Vehicle: {self.vehicle_model.get()} ({self.vehicle_year.get()})', ln=1)
-        pdf.cell(0, 6, f'VIN/Reg: {self.vehicle_vin.get()}', ln=1)
-        pdf.ln(4)
-
-        # Checklist table header
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(90, 6, 'Item', border=1)
-        pdf.cell(24, 6, 'Status', border=1)
-        pdf.cell(58, 6, 'Notes', border=1)
-        pdf.cell(18, 6, 'Est Cost', border=1, ln=1)
-
-        pdf.set_font('Arial', '', 9)
-        for item, status_var, notes_entry, cost_entry in self.check_vars:
-            status = status_var.get()
-            notes = notes_entry.get()[:150]
-            try:
-                cost = float(cost_entry.get() or 0)
-            except ValueError:
-                cost = 0
-            # Row layout
-            pdf.cell(90, 6, item[:60], border=1)
-            pdf.cell(24, 6, status, border=1)
-            pdf.cell(58, 6, notes, border=1)
-            pdf.cell(18, 6, f'{cost:.2f}', border=1, ln=1)
-
-        pdf.ln(4)
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(0, 6, f'Total Estimated Repair Cost: {final_total:.2f}', ln=1)
-        pdf.ln(4)
-
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(0, 6, 'Summary / Notes:', ln=1)
-        pdf.set_font('Arial', '', 10)
-        summary = self.summary_text.get('1.0', 'end').strip()
-        pdf.multi_cell(0, 6, summary or 'No additional notes provided.')
-        pdf.ln(4)
-
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(0, 6, 'Recommendation:', ln=1)
-        pdf.set_font('Arial', '', 10)
-        pdf.cell(0, 6, self.recommend_var.get(), ln=1)
-
-        # Sign area
-        pdf.ln(12)
-        pdf.cell(0, 6, 'Inspector Signature: ______________________         Client Signature: ______________________', ln=1)
-
-        # Save file
-        safe_client = ''.join(c for c in self.client_name.get() if c.isalnum() or c in (' ', '-', '_')).strip()
-        if not safe_client:
-            safe_client = 'client'
-        filename = f"{REPORTS_DIR}/PPI_{safe_client}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        try:
+        # Read the form here; everything after that runs on the worker thread
+        record = self.collect_record()
+        photo_paths = [list(p) for p in self.photo_paths]
+        branding = self.template.branding
+        filename = f"{REPORTS_DIR}/{report_filename(record)}"
+
+        def task(cancel):
+            # Imported here, on the worker, so fpdf does not delay the window opening
+            from report_engine import get_renderer
+
+            # The PDF is laid out before anything is saved, so a cancelled
+            # report leaves no trace in the database or the outbox
+            self.attach_photos(record, photo_paths)
+            pdf = get_renderer(*branding).render(record)
+            if cancel.is_set():
+                return None
+            self.store_record(record)
             pdf.output(filename)
-            messagebox.showinfo('Saved', f'Report saved as:\n{filename}')
-        except Exception as e:
-            messagebox.showerror('Error saving', str(e))
+            return f'Report saved as: {filename}'
+
+        self.run_in_background('Error saving', task)
 
     def save_csv(self):
         # Save checklist + metadata to CSV for records
-        import csv
-        safe_client = ''.join(c for c in self.client_name.get() if c.isalnum() or c in (' ', '-', '_')).strip() or 'client'
-        filename = f"{REPORTS_DIR}/PPI_{safe_client}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        record = self.collect_record()
+        photo_paths = [list(p) for p in self.photo_paths]
+        filename = f"{REPORTS_DIR}/{report_filename(record, ext='csv')}"
+
+        def task(cancel):
+            self.attach_photos(record, photo_paths)
+            if cancel.is_set():
+                return None
+            write_ppi_csv(record, filename)
+            self.store_record(record)
+            return f'CSV saved as: {filename}'
+
+        self.run_in_background('Error saving CSV', task)
+
+    # ---------------------- Background Work ----------------------
+    def run_in_background(self, error_title, task):
+        # task(cancel_event) runs on the worker and returns a status message,
+        # or None if it noticed the cancel event and stopped early.
+        cancel = threading.Event()
+        future = self.worker.submit(self._run_task, error_title, task, cancel)
+        self.pending.append((future, cancel))
+        self._update_progress()
+
+    def _run_task(self, error_title, task, cancel):
+        # Worker thread: never touch Tk widgets here, only the results queue
+        if cancel.is_set():
+            return
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Client', self.client_name.get()])
-                writer.writerow(['Phone', self.client_phone.get()])
-                writer.writerow(['Inspector', self.inspector.get()])
-                writer.writerow(['Vehicle', self.vehicle_model.get()])
-                writer.writerow(['Year', self.vehicle_year.get()])
-                writer.writerow(['VIN', self.vehicle_vin.get()])
-                writer.writerow([])
-                writer.writerow(['Item', 'Status', 'Notes', 'Est Cost'])
-                for item, status_var, notes_entry, cost_entry in self.check_vars:
-                    writer.writerow([item, status_var.get(), notes_entry.get(), cost_entry.get()])
-                writer.writerow([])
-                writer.writerow(['Summary', self.summary_text.get('1.0', 'end').strip()])
-                writer.writerow(['Recommendation', self.recommend_var.get()])
-            messagebox.showinfo('Saved', f'CSV saved as:\n{filename}')
+            message = task(cancel)
         except Exception as e:
-            messagebox.showerror('Error saving CSV', str(e))
+            self.results.put(('error', error_title, str(e)))
+        else:
+            self.results.put(('done', None, message or 'Cancelled'))
+
+    def poll_results(self):
+        while True:
+            try:
+                kind, title, message = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'error':
+                messagebox.showerror(title, message)
+            else:
+                self.status_var.set(message)
+        self.pending = [(f, c) for f, c in self.pending if not f.done()]
+        self._update_progress()
+        self._update_sync_status()
+        self.root.after(POLL_MS, self.poll_results)
+
+    def _update_progress(self):
+        if self.pending:
+            if not self.cancel_btn.instate(['!disabled']):
+                self.progress.start(10)
+                self.cancel_btn.state(['!disabled'])
+            # Cancelled work may still be finishing; it is not counted as saving
+            saving = sum(not cancel.is_set() for _, cancel in self.pending)
+            self.status_var.set(f'Saving {saving} item(s)...' if saving else 'Cancelling...')
+        elif self.cancel_btn.instate(['!disabled']):
+            self.progress.stop()
+            self.cancel_btn.state(['disabled'])
+            if self.status_var.get() == 'Cancelling...':
+                self.status_var.set('Cancelled')
+
+    def _update_sync_status(self):
+        waiting = len(self.outbox)
+        rejected = self.outbox.rejected
+        if not waiting or self.sync is None:
+            text = ''
+        elif self.sync.last_error:
+            text = f'Offline: {waiting} inspection(s) waiting to sync'
+        else:
+            text = f'{waiting} inspection(s) waiting to sync'
+        if rejected:
+            text = (text + ', ' if text else '') + f'{rejected} refused by the server'
+        if self.sync_var.get() != text:
+            self.sync_var.set(text)
+        if rejected > self.rejected_seen:
+            new, self.rejected_seen = rejected - self.rejected_seen, rejected
+            messagebox.showwarning('Sync', f'The server refused {new} inspection(s) as invalid. They were not '
+                                           f'sent and are kept, with the reasons, in {self.outbox.rejected_path}')
+
+    def cancel_background(self):
+        for future, cancel in self.pending:
+            cancel.set()
+            future.cancel()
+        self.status_var.set('Cancelling...')
+
+    def on_close(self):
+        if self.pending and not messagebox.askyesno('Quit', 'Reports are still being saved. Quit anyway?'):
+            return
+        self.cancel_background()
+        self.worker.shutdown(wait=False)
+        if self.sync:
+            self.sync.stop()  # anything unsent stays in the outbox for the next start
+        self.root.destroy()
 
     def clear_form(self):
         self.client_name.delete(0, 'end')
@@ -321,14 +388,10 @@ class PPIApp:
         self.vehicle_model.delete(0, 'end')
         self.vehicle_year.delete(0, 'end')
         self.vehicle_vin.delete(0, 'end')
-        for _, status, notes, cost in self.check_vars:
-            status.set('Pass')
-            notes.delete(0, 'end')
-            cost.delete(0, 'end')
-            cost.insert(0, '0')
         self.summary_text.delete('1.0', 'end')
-        self.recommend_var.set(RECOMMENDATIONS[0])
         self.total_cost_var.set('0')
+        # Fresh checklist rows, recommendation and photos for the same vehicle type
+        self.set_template(self.template.id)
 
 
 if __name__ == '__main__':
@@ -1,75 +1,377 @@
-from flask import Flask, render_template, request, send_file
-from fpdf import FPDF
+from flask import (Flask, Response, abort, g, jsonify, render_template, request, send_file, stream_with_context,
+                   url_for)
+import contextlib
+import io
 import os
-from datetime import datetime
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from checklists import get_catalog
+from inspection import new_record, record_from_dict, report_filename, validate_record_dict
+from inspection_store import get_store
+from metrics import HTTP_REQUESTS, HTTP_SECONDS, profiled, render_metrics, timed
+from photo_store import MAX_PHOTO_BYTES, get_photo_store
+from report_cache import get_report_cache
+from report_jobs import ReportJobQueue
+from report_storage import archive_async
 
 app = Flask(__name__)
+# Photo uploads are the largest requests; keep a ceiling on what is buffered
+app.config["MAX_CONTENT_LENGTH"] = 4 * MAX_PHOTO_BYTES
+
+REPORTS_DIR = "reports"
+INSPECTIONS_DB = os.environ.get("INSPECTIONS_DB", os.path.join(REPORTS_DIR, "inspections.db"))
+# Keep a copy of every generated PDF in REPORTS_DIR (written in the background)
+ARCHIVE_REPORTS = os.environ.get("ARCHIVE_REPORTS", "0") == "1"
+# Background rendering: "thread" or "process" workers
+REPORT_EXECUTOR = os.environ.get("REPORT_EXECUTOR", "thread")
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "4"))
+# Shared job state for multi-process servers (opt in; see gunicorn.conf.py)
+REPORT_JOBS_DIR = os.environ.get("REPORT_JOBS_DIR") or None
+# Allow ?profile=1 (or an X-Profile: 1 header) to dump a cProfile of that request
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(REPORTS_DIR, "profiles"))
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 500
+API_MAX_BATCH = 500
+# Answers to POST /api/inspections kept for replay by Idempotency-Key (per process)
+IDEMPOTENCY_TTL = 24 * 3600
+IDEMPOTENCY_MAX_ENTRIES = 10000
+
+# Heavy modules (fpdf, Pillow, csv, zipfile) are imported by the handlers
+# that need them, so a new instance starts serving without loading them.
+jobs = ReportJobQueue(REPORT_WORKERS, REPORT_EXECUTOR, state_dir=REPORT_JOBS_DIR)
+
+_replies = OrderedDict()  # (Idempotency-Key, path) -> (expires, status, body), oldest first
+_replies_lock = threading.Lock()
+
+def replayed_response():
+    # The stored answer to an earlier request with the same Idempotency-Key, or None
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return None
+    with _replies_lock:
+        entry = _replies.get((key, request.full_path))
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return Response(entry[2], status=entry[1], mimetype="application/json",
+                    headers={"Idempotent-Replayed": "true"})
+
+def remember_response(response, status):
+    key = request.headers.get("Idempotency-Key")
+    if key:
+        with _replies_lock:
+            _replies[(key, request.full_path)] = (time.monotonic() + IDEMPOTENCY_TTL, status, response.get_data())
+            _replies.move_to_end((key, request.full_path))
+            while len(_replies) > IDEMPOTENCY_MAX_ENTRIES:
+                _replies.popitem(last=False)
+    return response, status
+
+def checklist_template(template_id=None):
+    # Records name their checklist template (checklists.json) and reports carry
+    # its branding; raises KeyError for an unknown template id
+    return get_catalog().get(template_id)
+
+def archive_job(job):
+    archive_async(job.result, REPORTS_DIR, job.filename)
 
-# Ensure logo exists
-LOGO_PATH = "logo.jpeg"
+def describe_job(job):
+    info = job.describe()
+    info["status_url"] = url_for("job_status", job_id=job.id)
+    if info["status"] == "done":
+        info["pdf_url"] = url_for("job_pdf", job_id=job.id)
+    return info
+
+def request_json():
+    # Bulk clients may gzip the body (Content-Encoding: gzip); the unpacked
+    # size is held to the same ceiling as plain requests. None if unreadable.
+    data = request.get_data()
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        inflater = zlib.decompressobj(31)
+        try:
+            data = inflater.decompress(data, app.config["MAX_CONTENT_LENGTH"])
+        except zlib.error:
+            return None
+        if inflater.unconsumed_tail:
+            abort(413)
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+def profile_path(kind):
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(PROFILE_DIR, f"{request.endpoint}_{kind}_{stamp}.prof")
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    g.profile = None
+    if PROFILE_REQUESTS and (request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"):
+        g.profile = contextlib.ExitStack()
+        g.profile.enter_context(profiled(profile_path("request")))
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or "unknown"
+    HTTP_SECONDS.observe(time.perf_counter() - g.started, endpoint=endpoint)
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.teardown_request
+def stop_profiling(exc):
+    if g.get("profile") is not None:
+        g.profile.close()
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/')
 def index():
     return render_template('form.html')
 
+def form_record(template):
+    # The inspection posted by the web form, filled in from template. A missing
+    # field is answered with Flask's usual 400 Bad Request.
+    with timed("parse_form"):
+        # Collect form data
+        client_name = request.form['client_name']
+        client_phone = request.form['client_phone']
+        car_make = request.form['car_make']
+        car_model = request.form['car_model']
+        car_year = request.form['car_year']
+        inspection_notes = request.form['inspection_notes']
+
+        record = new_record(
+            client_name=client_name,
+            client_phone=client_phone,
+            vehicle_model=f"{car_make} {car_model}",
+            vehicle_year=car_year,
+            summary=inspection_notes,
+            template=template.key,
+            vehicle_make=car_make,  # printed as entered, even if it has a space in it
+        )
+    with timed("store"):
+        get_store(INSPECTIONS_DB).add(record, source="web")
+    return record
+
 @app.route('/generate', methods=['POST'])
 def generate_report():
-    # Collect form data
-    client_name = request.form['client_name']
-    client_phone = request.form['client_phone']
-    car_make = request.form['car_make']
-    car_model = request.form['car_model']
-    car_year = request.form['car_year']
-    inspection_notes = request.form['inspection_notes']
-
-    # Create PDF
-    pdf = FPDF()
-    pdf.add_page()
-
-    # Add logo
-    if os.path.exists(LOGO_PATH):
-        pdf.image(LOGO_PATH, 10, 8, 33)
-
-    # Title
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(80)  # move to the right
-    pdf.cell(30, 10, "Car Inspection Report", 0, 1, "C")
-
-    # Date
-    pdf.set_font("Arial", '', 12)
-    pdf.cell(0, 10, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True)
-
-    # Client Info
-    pdf.set_font("Arial", 'B', 14)
-    pdf.cell(0, 10, "Client Information", ln=True)
-    pdf.set_font("Arial", '', 12)
-    pdf.cell(0, 10, f"Name: {client_name}", ln=True)
-    pdf.cell(0, 10, f"Phone: {client_phone}", ln=True)
-
-    # Car Info
-    pdf.set_font("Arial", 'B', 14)
-    pdf.cell(0, 10, "Car Information", ln=True)
-    pdf.set_font("Arial", '', 12)
-    pdf.cell(0, 10, f"Make: {car_make}", ln=True)
-    pdf.cell(0, 10, f"Model: {car_model}", ln=True)
-    pdf.cell(0, 10, f"Year: {car_year}", ln=True)
-
-    # Inspection Notes
-    pdf.set_font("Arial", 'B', 14)
-    pdf.cell(0, 10, "Inspection Notes", ln=True)
-    pdf.set_font("Arial", '', 12)
-    pdf.multi_cell(0, 10, inspection_notes)
-
-    # Save file
-    filename = f"inspection_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join("reports", filename)
-
-    if not os.path.exists("reports"):
-        os.makedirs("reports")
-
-    pdf.output(filepath)
-
-    return send_file(filepath, as_attachment=True)
+    # The form expects the PDF itself, rendered while the request waits
+    # (clients that would rather poll use /generate/jobs)
+    from report_engine import get_renderer
+
+    try:
+        template = checklist_template(request.form.get("template"))
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    record = form_record(template)
+    # The form keeps its original car inspection report layout
+    data = get_report_cache().render_bytes(get_renderer(*template.branding, layout="car"), record)
+    filename = report_filename(record, prefix="inspection")
+    if ARCHIVE_REPORTS:
+        archive_async(data, REPORTS_DIR, filename)
+    with timed("send"):
+        return send_file(io.BytesIO(data), mimetype="application/pdf", as_attachment=True,
+                         download_name=filename)
+
+@app.route('/generate/jobs', methods=['POST'])
+def generate_report_job():
+    # Same form fields as /generate; answers 202 with a job to poll for the PDF
+    try:
+        template = checklist_template(request.form.get("template"))
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    record = form_record(template)
+    with timed("enqueue"):
+        # The rendering runs on a worker, so it gets a profile of its own
+        job = jobs.submit(template.branding, record, report_filename(record, prefix="inspection"),
+                          on_done=archive_job if ARCHIVE_REPORTS else None,
+                          profile_path=profile_path("render") if g.profile else None, layout="car")
+    return jsonify(describe_job(job)), 202, {"Location": url_for("job_status", job_id=job.id)}
+
+@app.route('/api/inspections', methods=['POST'])
+def api_add_inspections():
+    # Body: one inspection object, a list of them or {"inspections": [...]}.
+    # ?render=jobs (default) queues a report per inspection, ?render=zip renders
+    # the whole batch and answers with a zip of PDFs, ?render=none only stores.
+    # ?template=<id> picks the checklist template whose branding is printed,
+    # and is recorded as the template of inspections that do not name theirs.
+    # The body may be gzip-compressed. Inspections are stored by fingerprint,
+    # so a batch sent again (e.g. after a lost response) is not stored twice;
+    # sent with the same Idempotency-Key it also gets the first answer again
+    # (from the same process) instead of queueing its reports a second time.
+    render = request.args.get("render", "jobs")
+    if render not in ("jobs", "zip", "none"):
+        return jsonify({"error": "render must be jobs, zip or none"}), 400
+    replay = replayed_response()
+    if replay is not None:
+        return replay
+    try:
+        template = checklist_template(request.args.get("template"))
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    branding = template.branding
+    with timed("parse_json"):
+        payload = request_json()
+        single = isinstance(payload, dict) and "inspections" not in payload
+        batch = [payload] if single else payload.get("inspections") if isinstance(payload, dict) else payload
+        if not isinstance(batch, list) or not batch:
+            return jsonify({"error": "expected an inspection object or a non-empty list of them"}), 400
+        if len(batch) > API_MAX_BATCH:
+            return jsonify({"error": f"at most {API_MAX_BATCH} inspections per request"}), 413
+        # The batch is all or nothing: nothing is stored if any inspection is invalid
+        errors = [{"index": n, "errors": e} for n, e in enumerate(map(validate_record_dict, batch)) if e]
+        if not errors:
+            photos = get_photo_store()
+            errors = [{"index": n, "errors": [f"items[{i}].photos: unknown photo {p}"]}
+                      for n, data in enumerate(batch) for i, item in enumerate(data.get("items") or ())
+                      for p in item.get("photos") or () if not photos.exists(p)]
+        if errors:
+            return jsonify({"errors": errors}), 400
+        records = [record_from_dict(data) for data in batch]
+        if request.args.get("template"):
+            for record in records:
+                record.setdefault("template", template.key)
+    with timed("store"):
+        ids = get_store(INSPECTIONS_DB).add_many(records, source="api")
+
+    if render == "zip":
+        try:
+            pdfs = jobs.render_many(branding, records)
+        except Exception as e:
+            return jsonify({"error": f"rendering failed: {e}", "ids": ids}), 500
+        with timed("zip"):
+            import zipfile
+
+            buf = io.BytesIO()
+            index = []
+            with zipfile.ZipFile(buf, "w") as zf:
+                for inspection_id, record, data in zip(ids, records, pdfs):
+                    filename = f"{inspection_id}_{report_filename(record)}"
+                    zf.writestr(filename, data)
+                    index.append({"id": inspection_id, "filename": filename})
+                zf.writestr("inspections.json", jsonify(index).get_data())
+            buf.seek(0)
+        return send_file(buf, mimetype="application/zip", as_attachment=True,
+                         download_name=f"inspections_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip")
+
+    results = [{"id": inspection_id} for inspection_id in ids]
+    if render == "jobs":
+        with timed("enqueue"):
+            for result, record in zip(results, records):
+                job = jobs.submit(branding, record, report_filename(record),
+                                  on_done=archive_job if ARCHIVE_REPORTS else None)
+                result["job"] = describe_job(job)
+    return remember_response(jsonify(results[0] if single else {"results": results}), 201)
+
+@app.route('/api/photos', methods=['POST'])
+def api_add_photos():
+    # Multipart "photo" files, or a single image as the raw request body.
+    # Returns photo ids to list in an inspection item's "photos".
+    uploads = [f.read() for f in request.files.getlist("photo")] or [request.get_data()]
+    try:
+        with timed("photos"):
+            ids = [get_photo_store().add(data) for data in uploads]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"ids": ids}), 201
+
+@app.route('/api/photos/<photo_id>')
+def api_photo(photo_id):
+    # The print thumbnail, as embedded in the reports
+    path = get_photo_store().thumbnail(photo_id) if len(photo_id) == 64 and photo_id.isalnum() else None
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype="image/jpeg", max_age=365 * 24 * 3600)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(describe_job(job))
+
+@app.route('/jobs/<job_id>/pdf')
+def job_pdf(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    status = job.status
+    if status == "failed":
+        return jsonify(describe_job(job)), 500
+    if status != "done":
+        return jsonify(describe_job(job)), 202
+    with timed("send"):
+        return send_file(io.BytesIO(job.result), mimetype="application/pdf",
+                         as_attachment=True, download_name=job.filename)
+
+def parse_search_args(args):
+    # ?item=<checklist item>:<status> may be repeated; "to" is an inclusive day
+    item_status = []
+    for value in args.getlist("item"):
+        item, sep, status = value.rpartition(":")
+        if not sep or not item or not status:
+            raise ValueError(f"item must look like '<checklist item>:<status>', got {value!r}")
+        item_status.append((item, status))
+    date_from = args.get("from")
+    if date_from:
+        date_from = date.fromisoformat(date_from).isoformat()
+    date_to = args.get("to")
+    if date_to:
+        date_to = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+    limit = min(int(args.get("limit", SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return dict(vin_prefix=args.get("vin"), client=args.get("client"), date_from=date_from, date_to=date_to,
+                item_status=item_status, recommendation=args.get("recommendation"),
+                cursor=args.get("cursor"), limit=limit)
+
+@app.route('/inspections')
+def search_inspections():
+    try:
+        query = parse_search_args(request.args)
+        results, next_cursor = get_store(INSPECTIONS_DB).search(**query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    body = {"results": results, "next_cursor": next_cursor}
+    if next_cursor:
+        body["next_url"] = url_for("search_inspections", **dict(request.args.lists(), cursor=next_cursor))
+    return jsonify(body)
+
+@app.route('/inspections/export')
+def export_inspections():
+    # Same filters as /inspections, streamed as one CSV / JSON lines file
+    from inspection_export import FORMATS, export_chunks
+
+    fmt = request.args.get("format", "csv")
+    per = request.args.get("per", "inspection")
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    if fmt not in FORMATS or per not in ("inspection", "item"):
+        return jsonify({"error": "format must be csv or jsonl and per must be inspection or item"}), 400
+    try:
+        query = parse_search_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    del query["cursor"], query["limit"]
+    records = get_store(INSPECTIONS_DB).iter_records(**query)
+    name = "inspections" if per == "inspection" else "inspection-items"
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}" + (".gz" if compress else "")
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    return Response(stream_with_context(export_chunks(records, fmt, per, compress)), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@app.route('/inspections/<int:inspection_id>')
+def get_inspection(inspection_id):
+    record = get_store(INSPECTIONS_DB).get(inspection_id)
+    if record is None:
+        abort(404)
+    return jsonify(record)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=10000)
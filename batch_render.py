@@ -0,0 +1,159 @@
+"""
+Batch PDF generation for stored inspections.
+
+Renders every inspection found in the given inputs with a pool of worker
+processes. Inputs can be:
+ - CSV files written by the Tkinter app (PPIApp.save_csv)
+ - JSON lines files, one inspection record per line
+ - directories, which are scanned for *.csv and *.jsonl files
+
+Examples:
+ - python batch_render.py reports/ -o regenerated/
+ - python batch_render.py september.jsonl -o regenerated/ --workers 8
+
+Records that fail to parse or render are listed in a JSON lines failure
+log (failures.jsonl in the output folder by default).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from checklists import add_branding_arguments, branding_from_args
+from inspection import read_ppi_csv, record_from_dict, report_filename
+from report_engine import get_renderer
+
+# ---------------------- Configuration ----------------------
+INPUT_EXTENSIONS = ('.csv', '.jsonl')
+
+
+def iter_input_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(INPUT_EXTENSIONS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def iter_tasks(paths, out_dir):
+    # A task is (source, kind, payload, output path). JSON lines are parsed here
+    # so that output names can be de-duplicated; CSV files are parsed by workers.
+    seen = set()
+
+    def unique(filename):
+        stem, ext = os.path.splitext(filename)
+        n = 1
+        while filename in seen:
+            n += 1
+            filename = f'{stem}_{n}{ext}'
+        seen.add(filename)
+        return os.path.join(out_dir, filename)
+
+    for path in iter_input_files(paths):
+        if path.lower().endswith('.jsonl'):
+            with open(path, encoding='utf-8') as f:
+                for lineno, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    source = f'{path}:{lineno}'
+                    try:
+                        record = record_from_dict(json.loads(line))
+                        filename = report_filename(record)
+                    except Exception as e:
+                        yield source, 'error', f'{type(e).__name__}: {e}', None
+                        continue
+                    yield source, 'record', record, unique(filename)
+        else:
+            filename = os.path.splitext(os.path.basename(path))[0] + '.pdf'
+            yield path, 'csv', path, unique(filename)
+
+
+def render_task(task, branding):
+    source, kind, payload, out_path = task
+    if kind == 'error':
+        return source, payload
+    try:
+        record = read_ppi_csv(payload) if kind == 'csv' else payload
+        get_renderer(*branding).render(record).output(out_path)
+        return source, None
+    except Exception as e:
+        return source, f'{type(e).__name__}: {e}'
+
+
+def _render_chunk(tasks, branding):
+    return [render_task(task, branding) for task in tasks]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(paths, out_dir, branding, workers=None, chunk_size=16, failure_log=None, progress=sys.stderr):
+    """Render all inputs into out_dir and return (rendered, failed) counts."""
+    os.makedirs(out_dir, exist_ok=True)
+    failure_log = failure_log or os.path.join(out_dir, 'failures.jsonl')
+    tasks = list(iter_tasks(paths, out_dir))
+    total = len(tasks)
+    rendered = failed = 0
+    started = time.time()
+    log_file = None
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_render_chunk, chunk, branding) for chunk in _chunks(tasks, chunk_size)]
+        try:
+            for future in futures:
+                for source, error in future.result():
+                    if error is None:
+                        rendered += 1
+                    else:
+                        failed += 1
+                        if log_file is None:
+                            log_file = open(failure_log, 'w', encoding='utf-8')
+                        log_file.write(json.dumps({'source': source, 'error': error}) + '\n')
+                if progress:
+                    elapsed = time.time() - started
+                    rate = (rendered + failed) / elapsed if elapsed else 0
+                    progress.write(f'\r{rendered + failed}/{total} done, {failed} failed ({rate:.1f}/s)')
+                    progress.flush()
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+    if progress:
+        progress.write('\n')
+        if failed:
+            progress.write(f'Failures logged to {failure_log}\n')
+    return rendered, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render PDF reports for many stored inspections.')
+    parser.add_argument('inputs', nargs='+', help='CSV / JSON lines files or directories containing them')
+    parser.add_argument('-o', '--out', default='regenerated', help='output folder for the PDFs')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=16, help='records handed to a worker at a time')
+    parser.add_argument('--failure-log', help='where to write failed records (default: <out>/failures.jsonl)')
+    add_branding_arguments(parser)
+    args = parser.parse_args(argv)
+
+    branding = branding_from_args(args)
+    rendered, failed = run_batch(args.inputs, args.out, branding, workers=args.workers,
+                                 chunk_size=args.chunk_size, failure_log=args.failure_log)
+    print(f'Rendered {rendered} report(s), {failed} failed.')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Benchmarks for report rendering, the inspection store and the /generate endpoints.
+
+Runs synthetic inspections of different sizes through the shared renderer
+(the code path behind app.py, main.py and Test-2.py), the SQLite store and
+the Flask app's test client, then writes the results as JSON.
+
+Examples:
+ - python bench_reports.py --out bench.json
+ - python bench_reports.py --quick --out new.json --compare bench.json
+
+With --compare, any latency that got more than --threshold (default 20%)
+slower than in the baseline file is reported and the exit code is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from inspection import new_record
+
+SHOP = ('AUTO MAZEN', 'Dawhat Aramoun/Main Street', '03 419 833', 'logo.jpeg')
+ITEM_COUNT = 20
+LONG_NOTE = ('Minor oil seepage at the rear main seal, recommend monitoring and re-check at next '
+             'service; pads at 4mm front, rotors lipped, replace within 5,000 km.')
+MULTI_PAGE_SUMMARY = '\n'.join(
+    f'{n}. Observed during the test drive: slight vibration at highway speed, pulling to the left under '
+    'braking and a faint whine from the differential when coasting. Recommend a full road test with a '
+    'second inspector and a wheel alignment check before purchase.' for n in range(1, 61))
+
+SCENARIOS = {
+    'empty_notes': dict(notes='', summary=''),
+    'long_notes': dict(notes=LONG_NOTE, summary='Vehicle in fair condition overall.'),
+    'multi_page_summary': dict(notes=LONG_NOTE, summary=MULTI_PAGE_SUMMARY),
+    'multi_page_table': dict(notes=' '.join([LONG_NOTE] * 6), summary=''),
+}
+
+
+def synthetic_record(n, notes='', summary=''):
+    items = [(f'Checklist item {i:02d}', ('Pass', 'Minor', 'Major')[(n + i) % 3], notes, (n + i) % 7 * 25)
+             for i in range(ITEM_COUNT)]
+    return new_record(
+        client_name=f'Client {n}', client_phone=f'03 {n:06d}', inspector=f'Inspector {n % 5}',
+        vehicle_model='Toyota Corolla', vehicle_year=2010 + n % 12, vehicle_vin=f'JTDBR32E{n:09d}',
+        items=items, summary=summary, recommendation='Negotiate price (minor issues)',
+    )
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds for a list of durations in seconds."""
+    ms = sorted(s * 1000 for s in samples)
+
+    def pct(p):
+        return ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))]
+
+    return {
+        'n': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(pct(50), 3),
+        'p90_ms': round(pct(90), 3),
+        'p99_ms': round(pct(99), 3),
+        'max_ms': round(ms[-1], 3),
+    }
+
+
+# ---------------------- Benchmarks ----------------------
+def bench_render(iterations):
+    from report_engine import get_renderer
+
+    renderer = get_renderer(*SHOP)
+    results = {}
+    for name, params in SCENARIOS.items():
+        records = [synthetic_record(n, **params) for n in range(iterations)]
+        renderer.render_bytes(records[0])  # warm up
+
+        samples = []
+        started = time.perf_counter()
+        for record in records:
+            t = time.perf_counter()
+            data = renderer.render_bytes(record)
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - started
+
+        # Separate pass: tracemalloc slows allocation down too much to time with it on
+        tracemalloc.start()
+        renderer.render_bytes(records[0])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        stats = summarize(samples)
+        stats.update(throughput_per_s=round(len(records) / elapsed, 2), pdf_bytes=len(data),
+                     peak_memory_kb=round(peak / 1024, 1))
+        results[name] = stats
+    return results
+
+
+def bench_store(records_count, tmp):
+    from inspection_store import InspectionStore
+
+    store = InspectionStore(os.path.join(tmp, 'bench.db'))
+    records = [synthetic_record(n, notes=LONG_NOTE) for n in range(records_count)]
+    t = time.perf_counter()
+    store.add_many(records, source='bench')
+    insert = time.perf_counter() - t
+
+    vin_lookups = []
+    for n in range(0, records_count, max(1, records_count // 200)):
+        t = time.perf_counter()
+        store.find_by_vin(f'JTDBR32E{n:09d}')
+        vin_lookups.append(time.perf_counter() - t)
+
+    searches = []
+    cursor = None
+    for _ in range(20):
+        t = time.perf_counter()
+        _, cursor = store.search(item_status=[('Checklist item 03', 'Major')], cursor=cursor, limit=50)
+        searches.append(time.perf_counter() - t)
+        if cursor is None:
+            break
+    store.close()
+    return {
+        'bulk_insert': {'n': records_count, 'total_ms': round(insert * 1000, 3),
+                        'per_record_ms': round(insert * 1000 / records_count, 4)},
+        'find_by_vin': summarize(vin_lookups),
+        'search_page': summarize(searches),
+    }
+
+
+def bench_http(requests_per_level, levels, tmp):
+    """Load-test /generate (the PDF in the response) and /generate/jobs (a job polled until done)."""
+    os.environ['INSPECTIONS_DB'] = os.path.join(tmp, 'http.db')
+    import app as flask_app
+
+    counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def next_form():
+        with counter_lock:
+            n = next(counter)
+        return {'client_name': f'Load {n}', 'client_phone': '03 000000', 'car_make': 'Toyota',
+                'car_model': 'Corolla', 'car_year': '2015', 'inspection_notes': LONG_NOTE}
+
+    def generate(client, samples):
+        started = time.perf_counter()
+        response = client.post('/generate', data=next_form())
+        response.get_data()
+        samples['request'].append(time.perf_counter() - started)
+
+    def generate_job(client, samples):
+        started = time.perf_counter()
+        job = client.post('/generate/jobs', data=next_form()).get_json()
+        samples['submit'].append(time.perf_counter() - started)
+        while client.get(job['status_url']).get_json()['status'] not in ('done', 'failed'):
+            time.sleep(0.002)
+        client.get(f"/jobs/{job['id']}/pdf")
+        samples['end_to_end'].append(time.perf_counter() - started)
+
+    def client_loop(count, one_request, samples):
+        client = flask_app.app.test_client()
+        for _ in range(count):
+            one_request(client, samples)
+
+    results = {}
+    for name, one_request, kinds in (('generate', generate, ('request',)),
+                                     ('generate_jobs', generate_job, ('submit', 'end_to_end'))):
+        results[name] = {}
+        for concurrency in levels:
+            samples = {kind: [] for kind in kinds}
+            per_thread = max(1, requests_per_level // concurrency)
+            threads = [threading.Thread(target=client_loop, args=(per_thread, one_request, samples))
+                       for _ in range(concurrency)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            level = {kind: summarize(values) for kind, values in samples.items()}
+            level['throughput_per_s'] = round(len(samples[kinds[-1]]) / elapsed, 2)
+            results[name][f'concurrency_{concurrency}'] = level
+    flask_app.jobs.shutdown()
+    return results
+
+
+# ---------------------- Comparison ----------------------
+def iter_latencies(results, prefix=''):
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from iter_latencies(value, path + '.')
+        elif key.endswith('_ms') and key != 'max_ms':
+            yield path, value
+
+
+def compare(baseline, current, threshold):
+    """Return a list of (metric, old, new) whose latency regressed by more than threshold."""
+    old = dict(iter_latencies(baseline['results']))
+    regressions = []
+    for path, new in iter_latencies(current['results']):
+        if path in old and old[path] > 0 and new > old[path] * (1 + threshold):
+            regressions.append((path, old[path], new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark report rendering, storage and the HTTP endpoints.')
+    parser.add_argument('--out', default='bench_results.json', help='where to write the JSON results')
+    parser.add_argument('--iterations', type=int, default=200, help='reports rendered per scenario')
+    parser.add_argument('--store-records', type=int, default=20000, help='records inserted in the store benchmark')
+    parser.add_argument('--http-requests', type=int, default=64, help='requests per concurrency level')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated concurrency levels')
+    parser.add_argument('--quick', action='store_true', help='small sizes for a fast smoke run')
+    parser.add_argument('--compare', help='baseline JSON file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before flagging (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.iterations, args.store_records, args.http_requests = 20, 2000, 16
+
+    import fpdf
+
+    tmp = tempfile.mkdtemp(prefix='ppi-bench-')
+    try:
+        results = {
+            'render': bench_render(args.iterations),
+            'store': bench_store(args.store_records, tmp),
+            'http': bench_http(args.http_requests, [int(c) for c in args.concurrency.split(',')], tmp),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fpdf': getattr(fpdf, '__version__', 'unknown'),
+            'cpu_count': os.cpu_count(),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+    print(f'Results written to {args.out}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, output, args.threshold)
+        for path, old, new in regressions:
+            print(f'REGRESSION {path}: {old:.3f} ms -> {new:.3f} ms')
+        if regressions:
+            return 1
+        print('No regressions against', args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
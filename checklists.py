@@ -0,0 +1,218 @@
+"""
+Inspection checklist templates shared by all front ends and the renderer.
+
+Templates (checklist items grouped in categories, recommendations and the
+branding printed on the report) are defined in checklists.json, one per
+vehicle class. The file is parsed and validated once into an immutable
+Catalog; get_catalog() hands out the current one and re-checks the file's
+mtime at most every CHECK_INTERVAL seconds, so an edited file is picked up
+without a restart. An edit that does not validate is reported and the
+previous catalog stays in use.
+
+Usage:
+    template = get_catalog().get('motorbike')
+    template.items              # checklist item names, in order
+    template.recommendations
+    template.key                # 'motorbike@2', stored on the records filled in from it
+    get_renderer(*template.branding)
+
+The file is CHECKLISTS_FILE from the environment, default checklists.json.
+A template's version should be bumped whenever its items change; reports of
+records made from an older version are then printed without category rows.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+CATALOG_FORMAT = 1
+CHECK_INTERVAL = 2.0
+DEFAULT_PATH = os.environ.get('CHECKLISTS_FILE') or 'checklists.json'
+
+log = logging.getLogger(__name__)
+
+# A Branding unpacks straight into get_renderer(*branding)
+Branding = namedtuple('Branding', 'shop_name shop_address shop_phone logo_path')
+Category = namedtuple('Category', 'name items')
+
+
+class Template(namedtuple('Template', 'id version name categories recommendations branding')):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return f'{self.id}@{self.version}'
+
+    @property
+    def items(self):
+        return tuple(item for category in self.categories for item in category.items)
+
+
+class Catalog:
+    """Validated, read-only set of templates parsed from one version of the file."""
+
+    def __init__(self, templates, brandings, default_id, digest):
+        self.templates = MappingProxyType(templates)
+        self.brandings = MappingProxyType(brandings)
+        self.default = templates[default_id]
+        self.digest = digest
+
+    def get(self, template_id=None):
+        """The template with this id, or the default one; raises KeyError for an unknown id."""
+        if not template_id:
+            return self.default
+        try:
+            return self.templates[template_id]
+        except KeyError:
+            raise KeyError(f'Unknown checklist template {template_id!r}') from None
+
+    def find(self, key):
+        """The template a record was filled in from, by its key ('<id>@<version>').
+
+        None if there is no such template any more, or only another version of it.
+        """
+        template_id, _, version = (key or '').rpartition('@')
+        template = self.templates.get(template_id)
+        return template if template is not None and str(template.version) == version else None
+
+
+def _strings(value, where):
+    if not isinstance(value, list) or not value:
+        raise ValueError(f'{where}: expected a non-empty list of strings')
+    for n, text in enumerate(value):
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f'{where}[{n}]: expected a non-empty string')
+    if len(set(value)) != len(value):
+        raise ValueError(f'{where}: duplicate entries')
+    return tuple(value)
+
+
+def parse_catalog(data, digest=''):
+    """Validate parsed JSON and build a Catalog; raises ValueError naming the bad entry."""
+    if not isinstance(data, dict) or data.get('format') != CATALOG_FORMAT:
+        raise ValueError(f'expected an object with "format": {CATALOG_FORMAT}')
+
+    brandings = {}
+    for name, entry in (data.get('brandings') or {}).items():
+        where = f'brandings.{name}'
+        if not isinstance(entry, dict) or not isinstance(entry.get('shop_name'), str):
+            raise ValueError(f'{where}: expected an object with a shop_name')
+        for key in ('shop_address', 'shop_phone', 'logo'):
+            if entry.get(key) is not None and not isinstance(entry[key], str):
+                raise ValueError(f'{where}.{key}: expected a string')
+        brandings[name] = Branding(entry['shop_name'], entry.get('shop_address') or '',
+                                   entry.get('shop_phone') or '', entry.get('logo') or None)
+
+    templates = {}
+    for n, entry in enumerate(data.get('templates') or ()):
+        where = f'templates[{n}]'
+        if not isinstance(entry, dict):
+            raise ValueError(f'{where}: expected an object')
+        template_id = entry.get('id')
+        if not isinstance(template_id, str) or not template_id:
+            raise ValueError(f'{where}.id: expected a non-empty string')
+        if template_id in templates:
+            raise ValueError(f'{where}.id: duplicate template {template_id!r}')
+        version = entry.get('version')
+        if not isinstance(version, int) or isinstance(version, bool) or version < 1:
+            raise ValueError(f'{where}.version: expected a positive integer')
+        if entry.get('branding') not in brandings:
+            raise ValueError(f'{where}.branding: unknown branding {entry.get("branding")!r}')
+        if not isinstance(entry.get('categories'), list) or not entry['categories']:
+            raise ValueError(f'{where}.categories: expected a non-empty list')
+        categories = []
+        for c, category in enumerate(entry['categories']):
+            if not isinstance(category, dict) or not isinstance(category.get('name'), str):
+                raise ValueError(f'{where}.categories[{c}]: expected an object with a name')
+            categories.append(Category(category['name'], _strings(category.get('items'),
+                                                                  f'{where}.categories[{c}].items')))
+        template = Template(template_id, version, entry.get('name') or template_id, tuple(categories),
+                            _strings(entry.get('recommendations'), f'{where}.recommendations'),
+                            brandings[entry['branding']])
+        _strings(list(template.items), f'{where} items')  # item names must be unique across categories
+        templates[template_id] = template
+
+    if not templates:
+        raise ValueError('no templates defined')
+    default_id = data.get('default_template')
+    if default_id not in templates:
+        raise ValueError(f'default_template: unknown template {default_id!r}')
+    return Catalog(templates, brandings, default_id, digest)
+
+
+def load_catalog(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return parse_catalog(json.loads(raw), hashlib.sha256(raw).hexdigest())
+    except ValueError as e:
+        raise ValueError(f'{path}: {e}') from None
+
+
+class CatalogRegistry:
+    """Holds the current Catalog of a file and swaps in a new one when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._catalog = None
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked < CHECK_INTERVAL:
+            return self._catalog
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._catalog is None:
+                    raise
+                return self._catalog
+            if mtime != self._mtime:
+                try:
+                    self._catalog = load_catalog(self.path)
+                except ValueError:
+                    # A broken edit must not take the app down once it is running
+                    if self._catalog is None:
+                        raise
+                    log.exception('Keeping the previous checklist templates')
+                self._mtime = mtime
+            return self._catalog
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_catalog(path=None):
+    """The current catalog of templates (CHECKLISTS_FILE by default)."""
+    path = path or DEFAULT_PATH
+    registry = _registries.get(path)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(path, CatalogRegistry(path))
+    return registry.current()
+
+
+def add_branding_arguments(parser):
+    """Command line options selecting the branding of rendered reports (see branding_from_args)."""
+    parser.add_argument('--template', help='checklist template whose branding is used (default: the default one)')
+    parser.add_argument('--shop-name', help="override the template's shop name")
+    parser.add_argument('--shop-address', help="override the template's shop address")
+    parser.add_argument('--shop-phone', help="override the template's shop phone")
+    parser.add_argument('--logo', help="override the template's logo file")
+
+
+def branding_from_args(args):
+    overrides = {'shop_name': args.shop_name, 'shop_address': args.shop_address,
+                 'shop_phone': args.shop_phone, 'logo_path': args.logo}
+    branding = get_catalog().get(args.template).branding
+    return branding._replace(**{k: v for k, v in overrides.items() if v is not None})
@@ -0,0 +1,200 @@
+"""
+Fleet-wide analytics over the stored inspection history.
+
+The history is loaded once into columnar NumPy arrays (one array per field,
+strings replaced by integer codes) and every statistic is computed with
+array operations - bincount, lexsort and fancy indexing - instead of a
+Python loop over the records, so dashboards stay interactive over years
+of inspections.
+
+Every function returns a table as a dict of column name -> array, which
+Streamlit's st.dataframe and st.bar_chart accept directly.
+
+Example:
+ - python fleet_analytics.py [--db reports/inspections.db] [--from 2025-01-01 --to 2025-12-31]
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from inspection import STATUSES, add_date_range_arguments, date_range_from_args
+
+
+def _encode(values):
+    """Return (labels, codes) for a sequence of strings."""
+    labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return labels, codes.astype(np.intp)
+
+
+def _year(value):
+    value = str(value).strip()
+    return int(value) if value.isdigit() else 0
+
+
+class FleetData:
+    """Columnar view of the inspections in a date range."""
+
+    def __init__(self, inspections, items):
+        ids, dates, models, years, inspectors, recommendations, manual_totals = (
+            [list(c) for c in zip(*inspections)] if inspections else [[]] * 7)
+        self.size = len(ids)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.dates = np.asarray(dates, dtype='datetime64[s]')
+        models = [' '.join(m.split()) or 'Unknown' for m in models]
+        self.model_labels, self.model_codes = _encode(models)
+        self.make_labels, self.make_codes = _encode([m.split()[0] for m in models])
+        self.years = np.fromiter((_year(y) for y in years), dtype=np.int64, count=self.size)
+        self.inspector_labels, self.inspector_codes = _encode([i.strip() or 'Unknown' for i in inspectors])
+        self.recommendation_labels, self.recommendation_codes = _encode(
+            [r.strip() or 'None' for r in recommendations])
+
+        item_ids, item_names, statuses, costs = [list(c) for c in zip(*items)] if items else [[]] * 4
+        # Row index of each item's inspection; ids are sorted because both queries order by id
+        self.item_rows = np.searchsorted(self.ids, np.asarray(item_ids, dtype=np.int64))
+        self.item_labels, self.item_codes = _encode(item_names)
+        self.item_status = np.asarray([STATUSES.index(s) if s in STATUSES else 0 for s in statuses],
+                                      dtype=np.intp)
+        self.item_costs = np.asarray(costs, dtype=np.float64)
+
+        # Same rule as inspection.final_total: a manual total overrides the item sum
+        self.items_totals = np.bincount(self.item_rows, weights=self.item_costs, minlength=self.size)
+        manual_totals = np.asarray(manual_totals, dtype=np.float64)
+        self.totals = np.where(manual_totals > 0, manual_totals, self.items_totals)
+        self.minor_counts = np.bincount(self.item_rows[self.item_status == 1], minlength=self.size)
+        self.major_counts = np.bincount(self.item_rows[self.item_status == 2], minlength=self.size)
+
+
+def load_fleet_data(store, date_from=None, date_to=None):
+    """Load inspections dated in [date_from, date_to) from an InspectionStore."""
+    where, params = [], []
+    if date_from:
+        where.append('date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('date < ?')
+        params.append(date_to)
+    clause = f"WHERE {' AND '.join(where)}" if where else ''
+    conn = store.connection()
+    inspections = conn.execute(
+        'SELECT id, date, vehicle_model, vehicle_year, inspector, recommendation, total_cost '
+        f'FROM inspections {clause} ORDER BY id', params).fetchall()
+    items = conn.execute(
+        'SELECT inspection_id, item, status, cost FROM inspection_items '
+        f'WHERE inspection_id IN (SELECT id FROM inspections {clause}) ORDER BY inspection_id, position',
+        params).fetchall()
+    return FleetData(inspections, items)
+
+
+def _group_stats(labels, codes, values):
+    """Count, mean and percentiles of values per group code, all groups at once."""
+    n = len(labels)
+    counts = np.bincount(codes, minlength=n)
+    means = np.bincount(codes, weights=values, minlength=n) / np.maximum(counts, 1)
+    # Sorting by (group, value) lays each group out as one sorted slice
+    order = np.lexsort((values, codes))
+    ordered = values[order]
+    starts = np.cumsum(counts) - counts
+    last = np.maximum(counts - 1, 0)
+
+    def percentile(p):
+        return ordered[starts + np.floor(last * p).astype(np.intp)] if len(ordered) else np.zeros(n)
+
+    return {'count': counts, 'mean': means, 'p50': percentile(0.5), 'p90': percentile(0.9), 'max': percentile(1.0)}
+
+
+def failure_rates(data):
+    """Minor / major rate per checklist item, most often failed first."""
+    n = len(data.item_labels)
+    by_status = np.bincount(data.item_codes * len(STATUSES) + data.item_status,
+                            minlength=n * len(STATUSES)).reshape(n, len(STATUSES))
+    checked = by_status.sum(axis=1)
+    safe = np.maximum(checked, 1)
+    table = {
+        'item': data.item_labels,
+        'checked': checked,
+        'minor_rate': by_status[:, 1] / safe,
+        'major_rate': by_status[:, 2] / safe,
+        'fail_rate': (by_status[:, 1] + by_status[:, 2]) / safe,
+        'mean_cost': np.bincount(data.item_codes, weights=data.item_costs, minlength=n) / safe,
+    }
+    return _sorted(table, -table['fail_rate'])
+
+
+def cost_distribution(data, by='model'):
+    """Estimated repair cost statistics per make, model or model year."""
+    if by == 'make':
+        labels, codes = data.make_labels, data.make_codes
+    elif by == 'model':
+        labels, codes = data.model_labels, data.model_codes
+    elif by == 'year':
+        labels, codes = np.unique(data.years, return_inverse=True)
+    else:
+        raise ValueError("by must be 'make', 'model' or 'year'")
+    table = dict({by: labels}, **_group_stats(labels, codes, data.totals))
+    return table if by == 'year' else _sorted(table, -table['count'])
+
+
+def recommendation_breakdown(data):
+    counts = np.bincount(data.recommendation_codes, minlength=len(data.recommendation_labels))
+    table = {'recommendation': data.recommendation_labels, 'count': counts,
+             'share': counts / max(data.size, 1)}
+    return _sorted(table, -counts)
+
+
+def inspector_stats(data):
+    """Workload and findings per inspector."""
+    n = len(data.inspector_labels)
+    codes = data.inspector_codes
+    counts = np.bincount(codes, minlength=n)
+    safe = np.maximum(counts, 1)
+    last = np.full(n, np.datetime64('NaT'), dtype='datetime64[s]')
+    if data.size:
+        order = np.lexsort((data.dates, codes))
+        ends = np.cumsum(counts) - 1
+        last[counts > 0] = data.dates[order][ends[counts > 0]]
+    table = {
+        'inspector': data.inspector_labels,
+        'inspections': counts,
+        'mean_minor': np.bincount(codes, weights=data.minor_counts, minlength=n) / safe,
+        'mean_major': np.bincount(codes, weights=data.major_counts, minlength=n) / safe,
+        'mean_cost': np.bincount(codes, weights=data.totals, minlength=n) / safe,
+        'last_inspection': last,
+    }
+    return _sorted(table, -counts)
+
+
+def _sorted(table, key):
+    order = np.argsort(key, kind='stable')
+    return {name: column[order] for name, column in table.items()}
+
+
+def _print_table(title, table):
+    print(f'\n{title}')
+    names = list(table)
+    print('\t'.join(names))
+    for row in zip(*table.values()):
+        print('\t'.join(f'{v:.3f}' if isinstance(v, float) else str(v) for v in row))
+
+
+def main(argv=None):
+    from inspection_store import DEFAULT_DB_PATH, InspectionStore
+
+    parser = argparse.ArgumentParser(description='Print fleet analytics for the stored inspections.')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    add_date_range_arguments(parser)
+    args = parser.parse_args(argv)
+
+    data = load_fleet_data(InspectionStore(args.db), *date_range_from_args(args))
+    print(f'{data.size} inspection(s)')
+    _print_table('Failure rate per checklist item', failure_rates(data))
+    _print_table('Repair cost per make', cost_distribution(data, 'make'))
+    _print_table('Repair cost per model year', cost_distribution(data, 'year'))
+    _print_table('Recommendations', recommendation_breakdown(data))
+    _print_table('Inspectors', inspector_stats(data))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+gunicorn settings for the inspection service (see wsgi.py).
+
+Tunable through the environment:
+ - PORT                  listening port (default 10000)
+ - WEB_CONCURRENCY       worker processes (default: 2 x CPU cores + 1)
+ - WEB_THREADS           threads per worker (default 4)
+ - WEB_MAX_REQUESTS      requests before a worker is recycled (default 1000, 0 disables)
+ - WEB_TIMEOUT           seconds before a silent worker is restarted (default 60)
+ - METRICS_DIR           where workers share their metrics so /metrics reports totals
+                         (default: a folder in the temp dir, emptied when the server starts)
+ - REPORT_JOBS_DIR       opt in to job state shared by the workers (default: none, PDFs stay in
+                         memory). Set it when clients poll /generate/jobs, as the poll may
+                         reach a different worker than the one that queued the job.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+worker_class = "gthread"
+
+# Load the app (and the renderer, fonts and logo, see wsgi.py) in the master before forking
+preload_app = True
+
+# Recycle workers periodically; the jitter keeps them from all restarting at once
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+
+# Every worker (and render process) adds its numbers to the /metrics totals
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "ppi-metrics"))
+
+
+def on_starting(server):
+    # Counters start from zero with each server, like those of a single process
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach so that
+    # collections in the workers do not touch (and un-share) the preloaded pages.
+    gc.freeze()
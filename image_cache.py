@@ -0,0 +1,68 @@
+"""
+Process-wide cache of parsed branding images (logo etc.).
+
+fpdf parses an image file the first time it is placed in a document, so
+every report used to stat, read and parse logo.jpeg again. Here each file
+is parsed once per process and the parsed image is shared by every
+generated document. The file's mtime is re-checked at most once every
+CHECK_INTERVAL seconds so a replaced logo is picked up without a restart.
+"""
+
+import os
+import threading
+import time
+
+from fpdf import FPDF
+
+CHECK_INTERVAL = 2.0
+
+_cache = {}  # path -> (mtime, checked_at, info)
+_lock = threading.Lock()
+
+
+def _parse(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == 'jpg':
+        ext = 'jpeg'
+    parser = {'jpeg': '_parsejpg', 'png': '_parsepng'}.get(ext, '_parse' + ext)
+    return getattr(FPDF(), parser)(path)
+
+
+def load_image(path):
+    """Return fpdf's parsed image info for path, or None if the file is missing."""
+    now = time.monotonic()
+    entry = _cache.get(path)
+    if entry is not None and now - entry[1] < CHECK_INTERVAL:
+        return entry[2]
+
+    with _lock:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            _cache.pop(path, None)
+            return None
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == mtime:
+            info = entry[2]
+        else:
+            info = _parse(path)
+        _cache[path] = (mtime, now, info)
+        return info
+
+
+def place_image(pdf, path, x=None, y=None, w=0, h=0):
+    """Put a cached image on the current page of pdf. Returns False if the file is missing."""
+    if path not in pdf.images:
+        info = load_image(path)
+        if info is None:
+            return False
+        # fpdf numbers images per document and drops 'data' once written,
+        # so each document gets its own shallow copy of the shared info.
+        pdf.images[path] = dict(info, i=len(pdf.images) + 1)
+    pdf.image(path, x, y, w, h)
+    return True
+
+
+def clear():
+    with _lock:
+        _cache.clear()
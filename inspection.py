@@ -0,0 +1,297 @@
+"""
+Inspection records shared by the Flask, Streamlit and Tkinter front ends.
+
+A record is a plain dict so it can be rendered, stored or serialised
+without depending on any GUI toolkit:
+
+    {
+        'date': '2025-09-14 10:30:00',
+        'client_name': ..., 'client_phone': ..., 'inspector': ...,
+        'vehicle_model': ..., 'vehicle_year': ..., 'vehicle_vin': ...,
+        'items': [{'item': ..., 'status': 'Pass', 'notes': ..., 'cost': 0.0}, ...],
+        'summary': ..., 'recommendation': ..., 'total_cost': 0.0,
+    }
+
+A 'total_cost' of zero means "use the sum of the item costs". Items with
+photos attached also carry 'photos': a list of photo ids (see photo_store.py).
+Records filled in from a checklist template carry 'template': the
+template's key, '<id>@<version>' (see checklists.py). Records from forms
+that ask for the make separately carry it as 'vehicle_make'; 'vehicle_model'
+then starts with it.
+"""
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+
+STATUSES = ['Pass', 'Minor', 'Major']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def to_cost(value):
+    try:
+        cost = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    # 'nan' and 'inf' parse as floats but are not amounts (and cannot be stored)
+    return cost if math.isfinite(cost) else 0.0
+
+
+def new_record(client_name='', client_phone='', inspector='', vehicle_model='', vehicle_year='',
+               vehicle_vin='', items=(), summary='', recommendation='', total_cost=0, date=None, template='',
+               vehicle_make=''):
+    # items is an iterable of (item, status, notes, cost[, photo ids]) tuples as collected by the forms
+    if date is None:
+        date = datetime.datetime.now()
+    if isinstance(date, datetime.datetime):
+        date = date.strftime(DATE_FORMAT)
+    record = {
+        'date': date,
+        'client_name': client_name,
+        'client_phone': client_phone,
+        'inspector': inspector,
+        'vehicle_model': vehicle_model,
+        'vehicle_year': str(vehicle_year),
+        'vehicle_vin': vehicle_vin,
+        'items': [_new_item(*row) for row in items],
+        'summary': summary,
+        'recommendation': recommendation,
+        'total_cost': to_cost(total_cost),
+    }
+    # Only present when known, so older records keep their fingerprint
+    if template:
+        record['template'] = template
+    if vehicle_make:
+        record['vehicle_make'] = vehicle_make
+    return record
+
+
+def _new_item(item, status, notes, cost, photos=()):
+    entry = {'item': item, 'status': status, 'notes': notes, 'cost': to_cost(cost)}
+    if photos:
+        # Only present when used, so records without photos keep their fingerprint
+        entry['photos'] = list(photos)
+    return entry
+
+
+def record_from_dict(data):
+    """Build a record from a loosely typed dict such as a parsed JSON line."""
+    items = []
+    for row in data.get('items') or ():
+        if isinstance(row, dict):
+            row = (row.get('item', ''), row.get('status', 'Pass'), row.get('notes', ''), row.get('cost', 0),
+                   row.get('photos') or ())
+        items.append(tuple(row))
+    fields = ('client_name', 'client_phone', 'inspector', 'vehicle_model', 'vehicle_year',
+              'vehicle_vin', 'summary', 'recommendation', 'template', 'vehicle_make')
+    return new_record(items=items, total_cost=data.get('total_cost', 0), date=data.get('date'),
+                      **{k: '' if data.get(k) is None else str(data[k]) for k in fields})
+
+
+# Schema for inspections posted as JSON: field -> (accepted types, required, max length)
+RECORD_SCHEMA = {
+    'client_name': (str, True, 200),
+    'client_phone': (str, False, 50),
+    'inspector': (str, False, 200),
+    'vehicle_model': (str, True, 200),
+    'vehicle_year': ((str, int), False, 10),
+    'vehicle_vin': (str, False, 50),
+    'summary': (str, False, 20000),
+    'recommendation': (str, False, 200),
+    'total_cost': ((int, float), False, None),
+    'date': (str, False, 19),
+    'items': (list, False, 200),
+    'template': (str, False, 100),
+    'vehicle_make': (str, False, 100),
+}
+ITEM_SCHEMA = {
+    'item': (str, True, 200),
+    'status': (str, True, None),
+    'notes': (str, False, 2000),
+    'cost': ((int, float), False, None),
+    'photos': (list, False, 20),
+}
+_PHOTO_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _check_fields(data, schema, where=''):
+    if not isinstance(data, dict):
+        return [f'{where.rstrip(".") or "inspection"}: expected an object']
+    errors = [f'{where}{k}: unknown field' for k in data.keys() - schema.keys()]
+    for key, (types, required, max_len) in schema.items():
+        value = data.get(key)
+        if value is None:
+            if required:
+                errors.append(f'{where}{key}: required')
+        elif not isinstance(value, types) or isinstance(value, bool):
+            errors.append(f'{where}{key}: wrong type {type(value).__name__}')
+        elif max_len is not None and len(str(value) if isinstance(value, int) else value) > max_len:
+            errors.append(f'{where}{key}: longer than {max_len}')
+        elif types == (int, float) and not math.isfinite(value):
+            # json.loads accepts NaN and Infinity
+            errors.append(f'{where}{key}: must be a finite number')
+        elif types == (int, float) and value < 0:
+            errors.append(f'{where}{key}: must not be negative')
+    return errors
+
+
+def validate_record_dict(data):
+    """Check a parsed JSON inspection against RECORD_SCHEMA; returns a list of error messages."""
+    errors = _check_fields(data, RECORD_SCHEMA)
+    if errors and not isinstance(data, dict):
+        return errors
+    if isinstance(data.get('date'), str):
+        try:
+            datetime.datetime.strptime(data['date'], DATE_FORMAT)
+        except ValueError:
+            errors.append(f'date: expected {DATE_FORMAT}')
+    if isinstance(data.get('items'), list):
+        for n, item in enumerate(data['items']):
+            item_errors = _check_fields(item, ITEM_SCHEMA, f'items[{n}].')
+            if not item_errors and item['status'] not in STATUSES:
+                item_errors.append(f'items[{n}].status: must be one of {", ".join(STATUSES)}')
+            if not item_errors and not all(isinstance(p, str) and _PHOTO_ID_RE.match(p)
+                                           for p in item.get('photos') or ()):
+                item_errors.append(f'items[{n}].photos: expected a list of photo ids')
+            errors.extend(item_errors)
+    return errors
+
+
+_CSV_FIELDS = {
+    'Client': 'client_name', 'Phone': 'client_phone', 'Inspector': 'inspector',
+    'Vehicle': 'vehicle_model', 'Year': 'vehicle_year', 'VIN': 'vehicle_vin',
+    'Summary': 'summary', 'Recommendation': 'recommendation', 'Template': 'template',
+    'Total': 'total_cost', 'Make': 'vehicle_make',
+}
+_STAMP_RE = re.compile(r'_(\d{8}_\d{6})$')
+
+
+def read_ppi_csv(path):
+    """Read a record from the CSV layout written by PPIApp.save_csv in Test-2.py."""
+    import csv  # only the CSV tools need it; kept out of the front ends' startup
+
+    fields = {}
+    items = []
+    in_table = False
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if not row or not any(row):
+                in_table = False
+            elif row[:4] == ['Item', 'Status', 'Notes', 'Est Cost']:
+                in_table = True
+            elif in_table:
+                item, status, notes, cost, photos = (row + [''] * 5)[:5]
+                items.append((item, status, notes, cost, photos.split()))
+            elif row[0] in _CSV_FIELDS:
+                fields[_CSV_FIELDS[row[0]]] = row[1] if len(row) > 1 else ''
+
+    # The CSV has no date column; it is encoded in the PPI_<client>_<stamp>.csv name
+    match = _STAMP_RE.search(os.path.splitext(os.path.basename(path))[0])
+    if match:
+        date = datetime.datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+    else:
+        date = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+    return new_record(items=items, date=date, **fields)
+
+
+def read_record_file(path):
+    """Records from a PPIApp CSV file or a JSON lines file (one record per line)."""
+    if path.lower().endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            return [record_from_dict(json.loads(line)) for line in f if line.strip()]
+    return [read_ppi_csv(path)]
+
+
+def record_fingerprint(record):
+    """Stable id for an inspection: its content plus the day it was made.
+
+    Saving the same form twice (e.g. PDF then CSV) gives the same fingerprint,
+    so stores can ignore the duplicate.
+    """
+    content = {k: v for k, v in record.items() if k != 'id'}
+    content['date'] = record['date'][:10]
+    data = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def record_digest(record):
+    """Hash of everything a report prints from a record, the full date and time included.
+
+    Unlike record_fingerprint, two saves of a form on the same day differ here.
+    """
+    content = {k: v for k, v in record.items() if k != 'id'}
+    data = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def write_ppi_csv(record, path):
+    """Write a record in the CSV layout read back by read_ppi_csv."""
+    import csv
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Client', record['client_name']])
+        writer.writerow(['Phone', record['client_phone']])
+        writer.writerow(['Inspector', record['inspector']])
+        writer.writerow(['Vehicle', record['vehicle_model']])
+        writer.writerow(['Year', record['vehicle_year']])
+        writer.writerow(['VIN', record['vehicle_vin']])
+        if record.get('vehicle_make'):
+            writer.writerow(['Make', record['vehicle_make']])
+        if record.get('template'):
+            writer.writerow(['Template', record['template']])
+        writer.writerow([])
+        writer.writerow(['Item', 'Status', 'Notes', 'Est Cost', 'Photos'])
+        for i in record['items']:
+            # repr() is the shortest text that reads back as exactly the same amount
+            writer.writerow([i['item'], i['status'], i['notes'], repr(i['cost']), ' '.join(i.get('photos', ()))])
+        writer.writerow([])
+        writer.writerow(['Summary', record['summary']])
+        writer.writerow(['Recommendation', record['recommendation']])
+        if record['total_cost']:
+            # A manual total overriding the sum of the item costs
+            writer.writerow(['Total', repr(record['total_cost'])])
+
+
+def record_datetime(record):
+    return datetime.datetime.strptime(record['date'], DATE_FORMAT)
+
+
+def day(text):
+    # argparse type for a YYYY-mm-dd date; its name shows in the error ("invalid day value")
+    return datetime.date.fromisoformat(text)
+
+
+def add_date_range_arguments(parser):
+    """--from / --to options of the command line tools; both days are included (see date_range_from_args)."""
+    parser.add_argument('--from', dest='date_from', type=day, help='first day to include (YYYY-mm-dd)')
+    parser.add_argument('--to', dest='date_to', type=day, help='last day to include (YYYY-mm-dd)')
+
+
+def date_range_from_args(args):
+    """(date_from, date_to) strings for InspectionStore.search, whose date_to is exclusive."""
+    date_from = args.date_from.isoformat() if args.date_from else None
+    date_to = (args.date_to + datetime.timedelta(days=1)).isoformat() if args.date_to else None
+    return date_from, date_to
+
+
+def items_total(record):
+    return sum(i['cost'] for i in record['items'])
+
+
+def final_total(record):
+    # A manual total overrides the calculated one when it is set
+    manual = to_cost(record.get('total_cost'))
+    return manual if manual > 0 else items_total(record)
+
+
+def safe_client_name(client_name):
+    return ''.join(c for c in client_name if c.isalnum() or c in (' ', '-', '_')).strip() or 'client'
+
+
+def report_filename(record, prefix='PPI', ext='pdf'):
+    stamp = record_datetime(record).strftime('%Y%m%d_%H%M%S')
+    return f"{prefix}_{safe_client_name(record['client_name'])}_{stamp}.{ext}"
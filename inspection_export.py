@@ -0,0 +1,123 @@
+"""
+Streaming bulk export of the inspection history as flat CSV or JSON lines.
+
+Everything here is a generator: records are read from the store a page at
+a time and written out row by row, so memory use does not grow with the
+number of inspections. Output can be gzip-compressed on the fly.
+
+Examples:
+ - python inspection_export.py --from 2025-09-01 --to 2025-09-30 -o september.csv
+ - python inspection_export.py --per item --format jsonl -o items.jsonl.gz
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+
+from inspection import add_date_range_arguments, date_range_from_args, final_total, items_total
+
+FORMATS = ('csv', 'jsonl')
+INSPECTION_FIELDS = ('id', 'date', 'client_name', 'client_phone', 'inspector', 'vehicle_model', 'vehicle_year',
+                     'vehicle_vin', 'recommendation', 'summary', 'items_total', 'total_cost', 'final_total',
+                     'minor_count', 'major_count', 'template')
+ITEM_FIELDS = ('id', 'date', 'client_name', 'inspector', 'vehicle_model', 'vehicle_year', 'vehicle_vin',
+               'recommendation', 'position', 'item', 'status', 'notes', 'cost')
+
+
+def inspection_rows(records):
+    """One flat row per inspection."""
+    for record in records:
+        statuses = [i['status'] for i in record['items']]
+        row = {k: record.get(k, '') for k in INSPECTION_FIELDS[:10]}
+        row.update(items_total=items_total(record), total_cost=record['total_cost'],
+                   final_total=final_total(record), minor_count=statuses.count('Minor'),
+                   major_count=statuses.count('Major'), template=record.get('template', ''))
+        yield row
+
+
+def item_rows(records):
+    """One flat row per checklist item."""
+    for record in records:
+        base = {k: record.get(k, '') for k in ITEM_FIELDS[:8]}
+        for position, item in enumerate(record['items']):
+            yield dict(base, position=position, **item)
+
+
+def csv_chunks(rows, fields):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        # Hand out a chunk every few rows rather than one tiny write per row
+        if n % 100 == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def jsonl_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) == 100:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(records, fmt='csv', per='inspection', compress=False):
+    """Encoded export of records as a stream of bytes chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {FORMATS}')
+    if per not in ('inspection', 'item'):
+        raise ValueError("per must be 'inspection' or 'item'")
+    rows = inspection_rows(records) if per == 'inspection' else item_rows(records)
+    fields = INSPECTION_FIELDS if per == 'inspection' else ITEM_FIELDS
+    text = csv_chunks(rows, fields) if fmt == 'csv' else jsonl_chunks(rows)
+    chunks = (t.encode('utf-8') for t in text if t)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def main(argv=None):
+    from inspection_store import DEFAULT_DB_PATH, InspectionStore
+
+    parser = argparse.ArgumentParser(description='Export the inspection history as CSV or JSON lines.')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--per', choices=('inspection', 'item'), default='inspection',
+                        help='one row per inspection or per checklist item')
+    add_date_range_arguments(parser)  # --to is inclusive, like the "to" of /inspections/export
+    parser.add_argument('--gzip', action='store_true', help='compress the output (implied by a .gz file name)')
+    parser.add_argument('-o', '--out', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    compress = args.gzip or bool(args.out and args.out.endswith('.gz'))
+    date_from, date_to = date_range_from_args(args)
+    records = InspectionStore(args.db).iter_records(date_from=date_from, date_to=date_to)
+    out = open(args.out, 'wb') if args.out else sys.stdout.buffer
+    try:
+        for chunk in export_chunks(records, args.format, args.per, compress):
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
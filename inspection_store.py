@@ -0,0 +1,328 @@
+"""
+Persistent, indexed store of inspection records (SQLite).
+
+Every inspection submitted through the Flask, Streamlit or Tkinter front
+end is saved here, so past inspections can be looked up by VIN, client,
+phone, inspector or date without walking the reports folder.
+
+Existing PPI_<client>_<stamp>.csv / JSON lines files can be imported with:
+    python inspection_store.py import reports/ [--db reports/inspections.db]
+"""
+
+import argparse
+import base64
+import os
+import sqlite3
+import sys
+import threading
+
+from inspection import new_record, record_fingerprint
+
+DEFAULT_DB_PATH = os.path.join('reports', 'inspections.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inspections (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL,
+    client_name TEXT NOT NULL,
+    client_phone TEXT NOT NULL,
+    inspector TEXT NOT NULL,
+    vehicle_model TEXT NOT NULL,
+    vehicle_year TEXT NOT NULL,
+    vehicle_vin TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    recommendation TEXT NOT NULL,
+    total_cost REAL NOT NULL,
+    source TEXT NOT NULL,
+    template TEXT NOT NULL DEFAULT '',
+    vehicle_make TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS inspection_items (
+    inspection_id INTEGER NOT NULL REFERENCES inspections(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    status TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (inspection_id, position)
+);
+CREATE TABLE IF NOT EXISTS item_photos (
+    inspection_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    photo TEXT NOT NULL,
+    PRIMARY KEY (inspection_id, position, seq),
+    FOREIGN KEY (inspection_id, position) REFERENCES inspection_items(inspection_id, position) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_inspections_vin ON inspections(vehicle_vin COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS ix_inspections_client ON inspections(client_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS ix_inspections_phone ON inspections(client_phone);
+CREATE INDEX IF NOT EXISTS ix_inspections_inspector ON inspections(inspector COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS ix_inspections_date ON inspections(date);
+CREATE INDEX IF NOT EXISTS ix_inspections_recommendation ON inspections(recommendation, date);
+CREATE INDEX IF NOT EXISTS ix_items_status ON inspection_items(item, status, inspection_id);
+'''
+
+RECORD_COLUMNS = ('date', 'client_name', 'client_phone', 'inspector', 'vehicle_model', 'vehicle_year',
+                  'vehicle_vin', 'summary', 'recommendation', 'total_cost', 'template',
+                  'vehicle_make')
+OPTIONAL_COLUMNS = ('template', 'vehicle_make')  # added to the table after it was first released
+_INSERT_INSPECTION = (
+    f"INSERT INTO inspections (fingerprint, {', '.join(RECORD_COLUMNS)}, source) "
+    f"VALUES ({', '.join('?' * (len(RECORD_COLUMNS) + 2))}) "
+    # Only a duplicate inspection is skipped; any other constraint failure is an error
+    "ON CONFLICT(fingerprint) DO NOTHING"
+)
+_INSERT_ITEM = ('INSERT INTO inspection_items (inspection_id, position, item, status, notes, cost) '
+                'VALUES (?, ?, ?, ?, ?, ?)')
+_INSERT_PHOTO = 'INSERT INTO item_photos (inspection_id, position, seq, photo) VALUES (?, ?, ?, ?)'
+
+
+class InspectionStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(inspections)')}
+            # Databases created before records carried these fields
+            for column in OPTIONAL_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE inspections ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+
+    def connection(self):
+        # sqlite3 connections are not shared between threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------------------- Writing ----------------------
+    def add(self, record, source=''):
+        """Save one record and return its id (the existing id if it was already stored)."""
+        return self.add_many([record], source)[0]
+
+    def add_many(self, records, source=''):
+        """Save many records in a single transaction and return their ids."""
+        ids = []
+        conn = self.connection()
+        with conn:
+            for record in records:
+                fingerprint = record_fingerprint(record)
+                cur = conn.execute(_INSERT_INSPECTION,
+                                   (fingerprint, *(record.get(c, '') for c in RECORD_COLUMNS), source))
+                if cur.rowcount:
+                    inspection_id = cur.lastrowid
+                    conn.executemany(_INSERT_ITEM, [
+                        (inspection_id, pos, i['item'], i['status'], i['notes'], i['cost'])
+                        for pos, i in enumerate(record['items'])
+                    ])
+                    conn.executemany(_INSERT_PHOTO, [
+                        (inspection_id, pos, seq, photo)
+                        for pos, i in enumerate(record['items'])
+                        for seq, photo in enumerate(i.get('photos', ()))
+                    ])
+                else:
+                    row = conn.execute('SELECT id FROM inspections WHERE fingerprint = ?',
+                                       (fingerprint,)).fetchone()
+                    if row is None:
+                        raise sqlite3.IntegrityError(
+                            f'Inspection {fingerprint} was neither inserted nor found as a duplicate')
+                    inspection_id = row[0]
+                ids.append(inspection_id)
+        return ids
+
+    # ---------------------- Reading ----------------------
+    def _to_records(self, rows):
+        rows = list(rows)
+        if not rows:
+            return []
+        conn = self.connection()
+        ids = [row['id'] for row in rows]
+        items = {i: [] for i in ids}
+        photos = {}
+        for chunk_start in range(0, len(ids), 500):
+            chunk = ids[chunk_start:chunk_start + 500]
+            marks = ', '.join('?' * len(chunk))
+            for photo in conn.execute(
+                    f"SELECT inspection_id, position, photo FROM item_photos "
+                    f"WHERE inspection_id IN ({marks}) ORDER BY inspection_id, position, seq", chunk):
+                photos.setdefault((photo['inspection_id'], photo['position']), []).append(photo['photo'])
+            for item in conn.execute(
+                    f"SELECT inspection_id, position, item, status, notes, cost FROM inspection_items "
+                    f"WHERE inspection_id IN ({marks}) ORDER BY inspection_id, position", chunk):
+                items[item['inspection_id']].append(
+                    (item['item'], item['status'], item['notes'], item['cost'],
+                     photos.get((item['inspection_id'], item['position']), ())))
+        records = []
+        for row in rows:
+            record = new_record(items=items[row['id']], **{c: row[c] for c in RECORD_COLUMNS})
+            record['id'] = row['id']
+            records.append(record)
+        return records
+
+    def get(self, inspection_id):
+        rows = self.connection().execute('SELECT * FROM inspections WHERE id = ?', (inspection_id,))
+        records = self._to_records(rows)
+        return records[0] if records else None
+
+    def find_by_vin(self, vin):
+        """All inspections of a vehicle, newest first."""
+        rows = self.connection().execute(
+            'SELECT * FROM inspections WHERE vehicle_vin = ? COLLATE NOCASE ORDER BY date DESC, id DESC', (vin,))
+        return self._to_records(rows)
+
+    def find_by_client(self, client_name):
+        rows = self.connection().execute(
+            'SELECT * FROM inspections WHERE client_name = ? COLLATE NOCASE ORDER BY date DESC, id DESC',
+            (client_name,))
+        return self._to_records(rows)
+
+    def find_by_phone(self, phone):
+        rows = self.connection().execute(
+            'SELECT * FROM inspections WHERE client_phone = ? ORDER BY date DESC, id DESC', (phone,))
+        return self._to_records(rows)
+
+    def find_by_inspector(self, inspector):
+        rows = self.connection().execute(
+            'SELECT * FROM inspections WHERE inspector = ? COLLATE NOCASE ORDER BY date DESC, id DESC',
+            (inspector,))
+        return self._to_records(rows)
+
+    def find_between(self, start, end):
+        """Inspections with start <= date < end ('YYYY-mm-dd[ HH:MM:SS]' strings)."""
+        rows = self.connection().execute(
+            'SELECT * FROM inspections WHERE date >= ? AND date < ? ORDER BY date, id', (start, end))
+        return self._to_records(rows)
+
+    def search(self, vin_prefix=None, client=None, date_from=None, date_to=None, item_status=(),
+               recommendation=None, cursor=None, limit=50):
+        """Find inspections, newest first, one page at a time.
+
+        item_status is a list of (item, status) pairs that must all match.
+        date_from is inclusive and date_to exclusive. Pages are keyset paginated:
+        pass the returned cursor back to get the next page. Returns (records, cursor),
+        where cursor is None on the last page.
+        """
+        where = []
+        params = []
+        if vin_prefix:
+            where.append("vehicle_vin LIKE ? ESCAPE '\\'")
+            params.append(_like_escape(vin_prefix) + '%')
+        if client:
+            where.append("client_name LIKE ? ESCAPE '\\'")
+            params.append('%' + _like_escape(client) + '%')
+        if date_from:
+            where.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('date < ?')
+            params.append(date_to)
+        if recommendation:
+            where.append('recommendation = ?')
+            params.append(recommendation)
+        for item, status in item_status:
+            where.append('id IN (SELECT inspection_id FROM inspection_items WHERE item = ? AND status = ?)')
+            params.extend((item, status))
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            where.append('(date < ? OR (date = ? AND id < ?))')
+            params.extend((last_date, last_date, last_id))
+
+        sql = 'SELECT * FROM inspections'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY date DESC, id DESC LIMIT ?'
+        # Fetch one extra row to know whether another page exists
+        rows = self.connection().execute(sql, (*params, limit + 1)).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+        return self._to_records(rows), next_cursor
+
+    def iter_records(self, page_size=500, **filters):
+        """Yield every matching record, newest first, a page at a time."""
+        cursor = None
+        while True:
+            records, cursor = self.search(cursor=cursor, limit=page_size, **filters)
+            yield from records
+            if cursor is None:
+                return
+
+    def count(self):
+        return self.connection().execute('SELECT COUNT(*) FROM inspections').fetchone()[0]
+
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def encode_cursor(date, inspection_id):
+    return base64.urlsafe_b64encode(f'{date}|{inspection_id}'.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor."""
+    try:
+        date, inspection_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return date, int(inspection_id)
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=DEFAULT_DB_PATH):
+    """Return the process-wide store for a database file."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = InspectionStore(path)
+        return store
+
+
+def main(argv=None):
+    # Imported here so the store itself does not depend on the batch tooling
+    from batch_render import iter_input_files
+    from inspection import read_record_file
+
+    parser = argparse.ArgumentParser(description='Manage the inspection history database.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='import CSV / JSON lines files or folders')
+    imp.add_argument('inputs', nargs='+')
+    imp.add_argument('--db', default=DEFAULT_DB_PATH)
+    args = parser.parse_args(argv)
+
+    store = InspectionStore(args.db)
+    before = store.count()
+    failed = 0
+    for path in iter_input_files(args.inputs):
+        try:
+            store.add_many(read_record_file(path), source=os.path.basename(path))
+        except Exception as e:
+            failed += 1
+            print(f'{path}: {type(e).__name__}: {e}', file=sys.stderr)
+    print(f'Imported {store.count() - before} new inspection(s), {failed} file(s) failed.')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
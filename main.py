@@ -2,157 +2,131 @@
 # Run with: streamlit run ppi_streamlit.py
 
 import streamlit as st
-from fpdf import FPDF
-import datetime
 import os
 
+from checklists import get_catalog
+from inspection import new_record, report_filename
+from inspection_store import get_store
+from photo_store import get_photo_store
+from report_cache import cache_key, get_report_cache
+from report_storage import archive_async
+
 # ---------------------- Configuration ----------------------
-SHOP_NAME = "AUTO MAZEN"
-SHOP_ADDRESS = "Precision. Performance. Detailing."
-SHOP_PHONE = ""
-LOGO_PATH = "logo.jpeg"  # optional
+# Checklist items and recommendations come from the templates in checklists.json
+BRANDING_ID = "detailing"  # this app prints the detailing tagline instead of the template's branding
 REPORTS_DIR = "reports"
+DB_PATH = os.path.join(REPORTS_DIR, "inspections.db")
+ARCHIVE_REPORTS = False  # keep a copy of each PDF in REPORTS_DIR
+
+# ---------------------- Cached Resources ----------------------
+# Shared by every session of this server process instead of being rebuilt on each rerun.
+# The renderer brings in fpdf, so it is loaded with the first report, not the first page view.
+@st.cache_resource
+def load_renderer(branding):
+    from image_cache import load_image
+    from report_engine import get_renderer
+
+    if branding.logo_path:
+        load_image(branding.logo_path)
+    return get_renderer(*branding)
+
+
+@st.cache_resource
+def load_store():
+    return get_store(DB_PATH)
+
+
+@st.cache_resource
+def load_photos():
+    return get_photo_store()
+
 
-if not os.path.exists(REPORTS_DIR):
-    os.makedirs(REPORTS_DIR)
-
-CHECK_ITEMS = [
-    "Engine - Visual & Oil Leaks",
-    "Engine - Compression / Idle / Noises",
-    "Transmission / Clutch",
-    "Brakes - Pads / Rotors / Fluid",
-    "Suspension & Steering",
-    "Tires - Tread & Pressure",
-    "Exhaust System",
-    "Cooling System - Radiator / Hoses",
-    "Battery & Charging System",
-    "Lights & Electrical",
-    "Air Conditioning / Heating",
-    "Interior - Seats / Electronics",
-    "Body - Rust / Paint / Panels",
-    "Frame & Underbody",
-    "Test Drive - Noise / Vibration / Handling",
-]
-
-RECOMMENDATIONS = [
-    "Buy as-is",
-    "Negotiate price (minor issues)",
-    "Get major repairs before buying",
-    "Avoid purchase - too risky",
-]
-
-# ---------------------- PDF Helper ----------------------
-class InspectionPDF(FPDF):
-    def header(self):
-        if LOGO_PATH and os.path.exists(LOGO_PATH):
-            try:
-                self.image(LOGO_PATH, 10, 8, 30)
-            except Exception:
-                pass
-        self.set_font('Arial', 'B', 14)
-        self.cell(0, 6, SHOP_NAME, ln=True, align='R')
-        self.set_font('Arial', '', 9)
-        self.cell(0, 5, SHOP_ADDRESS + (' | ' + SHOP_PHONE if SHOP_PHONE else ''), ln=True, align='R')
-        self.ln(4)
-
-    def footer(self):
-        self.set_y(-20)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 5, f'Report generated: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}', ln=True, align='L')
-        self.cell(0, 5, 'Thank you for choosing ' + SHOP_NAME, ln=True, align='R')
+@st.cache_data(max_entries=100, show_spinner=False)
+def render_pdf(key, _renderer, _record):
+    # Cached on the record's content hash (which covers the branding); the
+    # leading underscores keep Streamlit from hashing the arguments themselves.
+    return get_report_cache().render_bytes(_renderer, _record)
 
 
 # ---------------------- Streamlit App ----------------------
 st.title("Pre-Purchase Vehicle Inspection (PPI)")
 
-# Client & Vehicle Details
-with st.expander("Client Details", expanded=True):
-    client_name = st.text_input("Client Name")
-    client_phone = st.text_input("Phone")
-    inspector = st.text_input("Inspector")
-
-with st.expander("Vehicle Details", expanded=True):
-    vehicle_model = st.text_input("Make / Model")
-    vehicle_year = st.text_input("Year")
-    vehicle_vin = st.text_input("VIN / Reg")
-
-# Inspection Checklist
-st.subheader("Inspection Checklist")
-
-check_data = []
-for item in CHECK_ITEMS:
-    cols = st.columns([3, 1, 4, 1])
-    status = cols[1].selectbox(f"{item}", ["Pass", "Minor", "Major"], key=f"status_{item}")
-    notes = cols[2].text_input("Notes", key=f"notes_{item}")
-    cost = cols[3].number_input("Est Cost", min_value=0.0, key=f"cost_{item}", format="%.2f")
-    check_data.append((item, status, notes, cost))
-
-# Summary & Recommendation
-summary = st.text_area("Summary / Notes")
-recommendation = st.selectbox("Recommendation", RECOMMENDATIONS)
-total_manual = st.number_input("Total Estimated Repair Cost", min_value=0.0, format="%.2f")
+# Read on every rerun; the catalog is parsed once and only reloaded when the file changes
+catalog = get_catalog()
+template = catalog.get(st.selectbox("Vehicle Type", list(catalog.templates),
+                                    format_func=lambda t: catalog.templates[t].name))
+branding = catalog.brandings.get(BRANDING_ID, template.branding)
+
+# All inputs live in one form so typing does not rerun the script;
+# only the submit button does.
+with st.form("inspection"):
+    # Client & Vehicle Details
+    with st.expander("Client Details", expanded=True):
+        client_name = st.text_input("Client Name")
+        client_phone = st.text_input("Phone")
+        inspector = st.text_input("Inspector")
+
+    with st.expander("Vehicle Details", expanded=True):
+        vehicle_model = st.text_input("Make / Model")
+        vehicle_year = st.text_input("Year")
+        vehicle_vin = st.text_input("VIN / Reg")
+
+    # Inspection Checklist
+    st.subheader("Inspection Checklist")
+
+    check_data = []
+    for category in template.categories:
+        st.markdown(f"**{category.name}**")
+        for item in category.items:
+            key = f"{template.id}_{item}"
+            cols = st.columns([3, 1, 4, 1, 2])
+            status = cols[1].selectbox(f"{item}", ["Pass", "Minor", "Major"], key=f"status_{key}")
+            notes = cols[2].text_input("Notes", key=f"notes_{key}")
+            cost = cols[3].number_input("Est Cost", min_value=0.0, key=f"cost_{key}", format="%.2f")
+            photos = cols[4].file_uploader("Photos", type=["jpg", "jpeg", "png", "webp"],
+                                           accept_multiple_files=True, key=f"photos_{key}")
+            check_data.append((item, status, notes, cost, photos))
+
+    # Summary & Recommendation
+    summary = st.text_area("Summary / Notes")
+    recommendation = st.selectbox("Recommendation", template.recommendations)
+    total_manual = st.number_input("Total Estimated Repair Cost", min_value=0.0, format="%.2f")
+
+    submitted = st.form_submit_button("Generate PDF Report")
 
 # Generate PDF
-if st.button("Generate PDF Report"):
-    # Calculate total
-    total_calc = sum([c[3] for c in check_data])
-    final_total = total_manual if total_manual > 0 else total_calc
-
-    pdf = InspectionPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 8, 'Pre-Purchase Vehicle Inspection Report', ln=True, align='C')
-    pdf.ln(4)
-
-    # Client & Vehicle Info
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(40, 6, f'Client: {client_name}', ln=0)
-    pdf.cell(0, 6, f'Date: {datetime.datetime.now().strftime("%Y-%m-%d")}', ln=1)
-    pdf.cell(40, 6, f'Phone: {client_phone}', ln=0)
-    pdf.cell(0, 6, f'Inspector: {inspector}', ln=1)
-    pdf.cell(80, 6, f'Vehicle: {vehicle_model} ({vehicle_year})', ln=1)
-    pdf.cell(0, 6, f'VIN/Reg: {vehicle_vin}', ln=1)
-    pdf.ln(4)
-
-    # Checklist Table
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(90, 6, 'Item', border=1)
-    pdf.cell(24, 6, 'Status', border=1)
-    pdf.cell(58, 6, 'Notes', border=1)
-    pdf.cell(18, 6, 'Est Cost', border=1, ln=1)
-
-    pdf.set_font('Arial', '', 9)
-    for item, status, notes_text, cost in check_data:
-        pdf.cell(90, 6, item[:60], border=1)
-        pdf.cell(24, 6, status, border=1)
-        pdf.cell(58, 6, notes_text[:150], border=1)
-        pdf.cell(18, 6, f'{cost:.2f}', border=1, ln=1)
-
-    pdf.ln(4)
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(0, 6, f'Total Estimated Repair Cost: {final_total:.2f}', ln=1)
-    pdf.ln(4)
-
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(0, 6, 'Summary / Notes:', ln=1)
-    pdf.set_font('Arial', '', 10)
-    pdf.multi_cell(0, 6, summary or 'No additional notes provided.')
-    pdf.ln(4)
-
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(0, 6, 'Recommendation:', ln=1)
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 6, recommendation, ln=1)
-
-    pdf.ln(12)
-    pdf.cell(0, 6, 'Inspector Signature: ______________________         Client Signature: ______________________', ln=1)
-
-    # Save PDF
-    safe_client = ''.join(c for c in client_name if c.isalnum() or c in (' ', '-', '_')).strip() or 'client'
-    filename = f"{REPORTS_DIR}/PPI_{safe_client}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    pdf.output(filename)
-
-    st.success(f"PDF report saved: {filename}")
-    with open(filename, "rb") as f:
-        st.download_button("Download PDF", f, file_name=os.path.basename(filename))
+if submitted:
+    # Originals are stored once; thumbnails are made in the background meanwhile
+    try:
+        check_data = [(item, status, notes, cost, [load_photos().add(f.getvalue()) for f in photos])
+                      for item, status, notes, cost, photos in check_data]
+    except ValueError as e:
+        st.error(f"Could not attach photo: {e}")
+        st.stop()
+    record = new_record(
+        client_name=client_name,
+        client_phone=client_phone,
+        inspector=inspector,
+        vehicle_model=vehicle_model,
+        vehicle_year=vehicle_year,
+        vehicle_vin=vehicle_vin,
+        items=check_data,
+        summary=summary,
+        recommendation=recommendation,
+        total_cost=total_manual,
+        template=template.key,
+    )
+    load_store().add(record, source="streamlit")
+    renderer = load_renderer(branding)
+    pdf_data = render_pdf(cache_key(renderer, record), renderer, record)
+    filename = report_filename(record)
+    # Kept in the session so the download button survives later reruns
+    st.session_state["report"] = (pdf_data, filename)
+
+    if ARCHIVE_REPORTS:
+        archive_async(pdf_data, REPORTS_DIR, filename)
+        st.success(f"PDF report saved: {os.path.join(REPORTS_DIR, filename)}")
+
+if "report" in st.session_state:
+    pdf_data, filename = st.session_state["report"]
+    st.download_button("Download PDF", pdf_data, file_name=filename, mime="application/pdf")
@@ -0,0 +1,318 @@
+"""
+In-process metrics for report generation, exposed in Prometheus text format.
+
+Stages of the report pipeline are timed with `timed(stage)`; counters track
+reports, bytes and errors.
+
+With several processes (gunicorn workers, a REPORT_EXECUTOR=process pool)
+set METRICS_DIR to a directory shared by all of them (gunicorn.conf.py does).
+Every process then writes a snapshot of its numbers there, at most every
+FLUSH_INTERVAL seconds and when it exits, and render_metrics() adds up the
+snapshots of all processes. Any worker answering a scrape of /metrics then
+reports the same totals. Snapshots of processes that have exited are folded
+into one file, so a recycled worker's counts are kept, not reset. Without
+METRICS_DIR each process reports only its own numbers.
+
+Profiling: `profiled(path)` runs a block under cProfile and dumps the stats
+to path (open with `python -m pstats <path>` or snakeviz).
+"""
+
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+FLUSH_INTERVAL = 5.0
+EXITED_FILE = 'exited.json'  # summed snapshots of processes that are gone
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        _shared.touch()
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, '') for n in self.labelnames), 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into, values):
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        _shared.touch()
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(data) for key, data in self._values.items()}
+
+    @staticmethod
+    def merge(into, values):
+        for key, data in values.items():
+            current = into.get(key)
+            into[key] = list(data) if current is None else [a + b for a, b in zip(current, data)]
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, data in sorted(values.items()):
+            for bound, count in zip(self.buckets, data):
+                le = _labels(self.labelnames, key, ['le="%s"' % bound])
+                lines.append(f'{self.name}_bucket{le} {count}')
+            le = _labels(self.labelnames, key, ['le="+Inf"'])
+            lines.append(f'{self.name}_bucket{le} {data[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {data[-2]}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {data[-1]}')
+        return lines
+
+
+# ---------------------- Sharing Between Processes ----------------------
+def _dump(snapshots):
+    # JSON has no tuple keys: {metric name: [[label values, value], ...]}
+    return {name: [[list(key), value] for key, value in values.items()] for name, values in snapshots.items()}
+
+
+def _load(data):
+    return {name: {tuple(key): value for key, value in pairs} for name, pairs in data.items()}
+
+
+def _merge(into, snapshots):
+    metrics = {m.name: m for m in _registry}
+    for name, values in snapshots.items():
+        if name in metrics:
+            metrics[name].merge(into.setdefault(name, {}), values)
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) would end the process there; its snapshot is simply kept
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """Writes this process's snapshot to METRICS_DIR and adds up everyone's."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._pid = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def touch(self):
+        # Called on every update; cheap unless this is the first one in this process
+        if self.directory is None:
+            return
+        self._dirty = True
+        if self._pid != os.getpid():
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # A forked child: the inherited numbers belong to the parent's snapshot
+                for metric in _registry:
+                    with metric._lock:
+                        metric._values.clear()
+            self._pid = os.getpid()
+            os.makedirs(self.directory, exist_ok=True)
+            # A snapshot under our pid is from an earlier process that reused it
+            with self._exclusive():
+                if os.path.exists(self._path(self._pid)):
+                    self._fold([self._path(self._pid)])
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return
+        self._dirty = False
+        data = json.dumps(_dump({m.name: m.snapshot() for m in _registry}))
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self._pid)
+        tmp = path + '.part'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        try:
+            import fcntl  # POSIX only, and only needed once METRICS_DIR is set
+        except ImportError:
+            # Without flock (Windows) folding is not locked; it only matters for
+            # several processes sharing METRICS_DIR, i.e. a server
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return _load(json.load(f))
+        except (OSError, ValueError):
+            return {}
+
+    def _fold(self, paths):
+        # Caller holds _exclusive(): add snapshots to the exited total and drop them
+        exited_path = os.path.join(self.directory, EXITED_FILE)
+        exited = self._read(exited_path)
+        for path in paths:
+            _merge(exited, self._read(path))
+        tmp = exited_path + '.part'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_dump(exited), f)
+        os.replace(tmp, exited_path)
+        for path in paths:
+            os.remove(path)
+
+    def collect(self):
+        """Totals over every process that has written to the directory."""
+        self.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        with self._exclusive():
+            live, gone = [], []
+            for entry in os.scandir(self.directory):
+                pid = entry.name[:-len('.json')]
+                if entry.name.endswith('.json') and pid.isdigit():
+                    (live if _pid_alive(int(pid)) else gone).append(entry.path)
+            if gone:
+                self._fold(gone)
+            totals = self._read(os.path.join(self.directory, EXITED_FILE))
+            for path in live:
+                _merge(totals, self._read(path))
+        return totals
+
+
+_shared = SharedMetrics(METRICS_DIR)
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format, over all processes sharing METRICS_DIR."""
+    totals = _shared.collect() if METRICS_DIR else {}
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(totals.get(metric.name, {}) if METRICS_DIR else None))
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------- Report Pipeline Metrics ----------------------
+STAGE_SECONDS = Histogram('ppi_stage_seconds', 'Time spent in each stage of report generation.', ('stage',))
+REPORTS = Counter('ppi_reports_total', 'Reports rendered.')
+REPORT_BYTES = Counter('ppi_report_bytes_total', 'Bytes of PDF produced.')
+REPORT_ERRORS = Counter('ppi_report_errors_total', 'Reports that failed to render.')
+CACHE_LOOKUPS = Counter('ppi_report_cache_lookups_total', 'Report cache lookups.', ('result',))
+HTTP_REQUESTS = Counter('ppi_http_requests_total', 'HTTP requests handled.', ('endpoint', 'status'))
+HTTP_SECONDS = Histogram('ppi_http_request_seconds', 'HTTP request latency.', ('endpoint',))
+
+
+def timed(stage):
+    return STAGE_SECONDS.time(stage=stage)
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """Profile the enclosed block with cProfile and write the stats to path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,279 @@
+"""
+Offline-first outbox: a durable local queue of inspections waiting to be
+sent to the central server.
+
+Completed inspections are appended to a journal file (one JSON line each,
+flushed and fsynced) and a background thread posts them in batches to the
+server's bulk endpoint, POST /api/inspections?render=none, gzip-compressed.
+Appending never touches the network, so a form is saved just as fast with
+or without a connection.
+
+Every inspection is keyed by its record fingerprint. Each batch is sent
+with an Idempotency-Key header derived from those keys, so the server can
+answer a batch sent again after a lost response with its first response;
+as it also stores inspections by fingerprint, nothing is stored twice
+either way. Keys the server has confirmed are appended to a second file,
+<journal>.sent, and once everything has been sent both files are emptied.
+Photos attached to the inspections are uploaded to /api/photos before the
+batch that refers to them; their ids are kept in <journal>.photos.
+
+A batch the server rejects as invalid (400) is never retried: the bad
+inspections are written to <journal>.rejected with the server's errors and
+the rest are sent again. Outbox.rejected counts them so the front end can
+tell the user. Anything else (no connection, timeouts, server errors, or
+any unexpected failure) is retried with exponential backoff.
+
+Usage:
+    outbox = Outbox('reports/outbox.jsonl')
+    sync = OutboxSync(outbox, 'https://inspections.example.com')
+    sync.start()
+    outbox.append(record)           # returns immediately
+    sync.wake()                     # optional: try now rather than at the next interval
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+
+from inspection import record_fingerprint
+
+BATCH_SIZE = 100  # inspections per request; the server accepts up to 500
+SYNC_INTERVAL = 30.0  # seconds between attempts while there is nothing to retry
+RETRY_MIN = 5.0
+RETRY_MAX = 600.0
+TIMEOUT = 30.0
+
+log = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Append-only journal of records plus the logs of what the server has confirmed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.sent_path = path + '.sent'
+        self.photos_path = path + '.photos'
+        self.rejected_path = path + '.rejected'
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending = {}  # key -> record, in journal order
+        self._sent = set(self._read_lines(self.sent_path))
+        self._photos = set(self._read_lines(self.photos_path))
+        # Older outboxes kept the uploaded photo ids (SHA-256) in .sent as well
+        moved = [k for k in self._sent if len(k) == 64 and k not in self._photos]
+        if moved:
+            self._append_lines(self.photos_path, moved)
+            self._photos.update(moved)
+        self.rejected = len(self._read_lines(self.rejected_path))
+        for line in self._read_lines(self.path):
+            try:
+                entry = json.loads(line)
+                key, record = entry['key'], entry['record']
+            except (ValueError, TypeError, KeyError):
+                # A crash in the middle of a write can leave a torn line behind
+                log.warning('Skipping an unreadable outbox entry in %s', self.path)
+                continue
+            if key not in self._sent:
+                self._pending[key] = record
+
+    @staticmethod
+    def _read_lines(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _append_lines(path, lines):
+        with open(path, 'ab+') as f:
+            # Start on a fresh line if a crash left a partial one behind
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, record):
+        """Queue a record for sending and return its key; a record already queued or sent is skipped."""
+        key = record_fingerprint(record)
+        with self._lock:
+            if key not in self._pending and key not in self._sent:
+                line = json.dumps({'key': key, 'record': record}, ensure_ascii=False, separators=(',', ':'))
+                self._append_lines(self.path, [line])
+                self._pending[key] = record
+        return key
+
+    def pending(self, limit=None):
+        """The oldest unsent (key, record) pairs."""
+        with self._lock:
+            entries = list(self._pending.items())
+        return entries[:limit] if limit else entries
+
+    def __len__(self):
+        return len(self._pending)
+
+    def is_sent(self, key):
+        return key in self._sent
+
+    def is_uploaded(self, photo_id):
+        return photo_id in self._photos
+
+    def mark_uploaded(self, photo_id):
+        with self._lock:
+            if photo_id not in self._photos:
+                self._append_lines(self.photos_path, [photo_id])
+                self._photos.add(photo_id)
+
+    def mark_sent(self, keys):
+        with self._lock:
+            keys = [k for k in keys if k not in self._sent]
+            if not keys:
+                return
+            self._append_lines(self.sent_path, keys)
+            self._sent.update(keys)
+            for key in keys:
+                self._pending.pop(key, None)
+            if not self._pending:
+                self._compact()
+
+    def reject(self, key, errors):
+        """Set an inspection the server refused aside; it is kept in the .rejected file."""
+        with self._lock:
+            record = self._pending.get(key)
+            if record is not None:
+                line = json.dumps({'key': key, 'errors': errors, 'record': record}, ensure_ascii=False)
+                self._append_lines(self.rejected_path, [line])
+                self.rejected += 1
+        self.mark_sent([key])
+
+    def _compact(self):
+        # Everything has been sent: start both files afresh. The journal is
+        # emptied first, so a crash in between only leaves stale keys behind.
+        # The .photos file is kept, as later inspections may refer to the same photos.
+        for path in (self.path, self.sent_path):
+            tmp = path + '.part'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        self._sent = set()
+
+
+class OutboxSync:
+    """Background thread sending an Outbox to the server in gzip-compressed batches."""
+
+    def __init__(self, outbox, server_url, photo_store=None, batch_size=BATCH_SIZE, interval=SYNC_INTERVAL):
+        self.outbox = outbox
+        self.server_url = server_url.rstrip('/')
+        self.photo_store = photo_store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='outbox-sync', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        # Does not wait: a request in flight is simply sent again next time
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        delay = RETRY_MIN
+        while not self._stop.is_set():
+            try:
+                while len(self.outbox) and not self._stop.is_set():
+                    self.send_batch()
+                self.last_error = None
+                delay = RETRY_MIN
+                timeout = self.interval
+            except Exception as e:
+                # Whatever went wrong, the thread lives on and tries again later
+                self.last_error = str(e) or type(e).__name__
+                timeout = delay * random.uniform(0.5, 1.0)  # jitter, so laptops do not retry in step
+                log.warning('Outbox sync failed, retrying in %.0fs: %s', timeout, e,
+                            exc_info=not isinstance(e, (OSError, ValueError)))
+                delay = min(delay * 2, RETRY_MAX)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _post(self, path, data, headers):
+        # urllib.request (and ssl) is only needed once there is something to send
+        import urllib.error
+        import urllib.request
+
+        req = urllib.request.Request(self.server_url + path, data=data, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+                return resp.status, json.loads(resp.read() or b'null')
+        except urllib.error.HTTPError as e:
+            if e.code != 400:
+                raise
+            try:
+                return e.code, json.loads(e.read() or b'null')
+            except ValueError:
+                return e.code, None
+
+    def _upload_photos(self, records):
+        for record in records:
+            for item in record['items']:
+                for photo_id in item.get('photos') or ():
+                    if self.outbox.is_uploaded(photo_id):
+                        continue
+                    # A photo that is missing or refused is skipped: the server then
+                    # reports it as unknown and only that inspection is set aside
+                    path = self.photo_store.original_path(photo_id) if self.photo_store else None
+                    if path is None:
+                        continue
+                    try:
+                        with open(path, 'rb') as f:
+                            data = f.read()
+                    except OSError as e:
+                        log.warning('Cannot read photo %s: %s', photo_id, e)
+                        continue
+                    status, body = self._post('/api/photos', data, {'Content-Type': 'application/octet-stream'})
+                    if status != 201:
+                        log.warning('Photo %s refused by the server: %s', photo_id, body)
+                        continue
+                    self.outbox.mark_uploaded(photo_id)
+
+    def send_batch(self):
+        """Send the oldest pending inspections; returns how many the server stored."""
+        batch = self.outbox.pending(self.batch_size)
+        if not batch:
+            return 0
+        keys = [key for key, _ in batch]
+        records = [record for _, record in batch]
+        self._upload_photos(records)
+        body = gzip.compress(json.dumps({'inspections': records}, ensure_ascii=False).encode('utf-8'))
+        status, response = self._post('/api/inspections?render=none', body, {
+            'Content-Type': 'application/json', 'Content-Encoding': 'gzip',
+            # The same batch always gets the same key, however often it is sent
+            'Idempotency-Key': hashlib.sha256(' '.join(keys).encode('ascii')).hexdigest()})
+        if status == 400:
+            errors = response.get('errors') if isinstance(response, dict) else None
+            if not errors:
+                raise ValueError(f'batch refused: {response}')
+            # The server stores nothing from a batch with an invalid inspection:
+            # set those aside and send the others again
+            for error in errors:
+                self.outbox.reject(keys[error['index']], error['errors'])
+            return 0
+        self.outbox.mark_sent(keys)
+        return len(keys)
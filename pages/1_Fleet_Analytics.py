@@ -0,0 +1,50 @@
+# Dashboard page of the Streamlit app (streamlit run main.py picks it up from pages/)
+
+import streamlit as st
+from datetime import date, timedelta
+
+from fleet_analytics import (cost_distribution, failure_rates, inspector_stats, load_fleet_data,
+                             recommendation_breakdown)
+from inspection_store import DEFAULT_DB_PATH, get_store
+
+DB_PATH = DEFAULT_DB_PATH  # same database as main.py
+
+
+@st.cache_data(ttl=60, show_spinner="Loading inspections...")
+def load_data(date_from, date_to):
+    return load_fleet_data(get_store(DB_PATH), date_from, date_to)
+
+
+st.title("Fleet Analytics")
+
+period = st.date_input("Inspection dates", value=(date.today() - timedelta(days=365), date.today()))
+if len(period) != 2:
+    st.stop()
+data = load_data(period[0].isoformat(), (period[1] + timedelta(days=1)).isoformat())
+
+if not data.size:
+    st.info("No inspections in this period.")
+    st.stop()
+
+cols = st.columns(3)
+cols[0].metric("Inspections", data.size)
+cols[1].metric("Average repair estimate", f"{data.totals.mean():.2f}")
+cols[2].metric("Major findings per car", f"{data.major_counts.mean():.2f}")
+
+st.subheader("Failure rate per checklist item")
+rates = failure_rates(data)
+st.bar_chart({"item": rates["item"], "minor": rates["minor_rate"], "major": rates["major_rate"]},
+             x="item", y=["minor", "major"], horizontal=True)
+st.dataframe(rates, hide_index=True)
+
+st.subheader("Repair cost estimates")
+by = st.radio("Group by", ["make", "model", "year"], horizontal=True)
+st.dataframe(cost_distribution(data, by), hide_index=True)
+
+left, right = st.columns(2)
+with left:
+    st.subheader("Recommendations")
+    st.dataframe(recommendation_breakdown(data), hide_index=True)
+with right:
+    st.subheader("Inspectors")
+    st.dataframe(inspector_stats(data), hide_index=True)
@@ -0,0 +1,166 @@
+"""
+Photos attached to checklist items, with print-resolution thumbnails.
+
+Originals are stored once under their SHA-256 (the photo id), however many
+inspections refer to them. Reports never embed the originals: a pool of
+background workers decodes, rotates, downscales and recompresses each photo
+into a JPEG thumbnail sized for print, cached on disk next to the originals
+by the same content hash. Thumbnails are started as soon as a photo is
+added, so they are usually ready by the time the report is rendered.
+
+Layout:
+    <directory>/originals/<id>.<ext>
+    <directory>/thumbs/<id>_<THUMB_MAX_PX>.jpg
+
+The process-wide store is configured from the environment:
+ - PHOTOS_DIR      where photos are kept (default reports/photos)
+ - PHOTO_WORKERS   thumbnail worker threads (default: CPU count)
+Pillow is imported with the first photo, not when a front end starts.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from report_storage import write_report
+
+THUMB_MAX_PX = 640  # longest side; 200 dpi at the largest size a report prints a photo (80mm)
+THUMB_QUALITY = 80
+MAX_PHOTO_BYTES = 25 * 1024 * 1024
+FORMATS = {'JPEG': '.jpg', 'MPO': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}  # Pillow format -> extension
+PHOTOS_DIR = os.environ.get('PHOTOS_DIR') or os.path.join('reports', 'photos')
+PHOTO_WORKERS = int(os.environ.get('PHOTO_WORKERS', '0')) or None
+
+
+class PhotoStore:
+    def __init__(self, directory, workers=None):
+        self.directory = directory
+        self._originals = os.path.join(directory, 'originals')
+        self._thumbs = os.path.join(directory, 'thumbs')
+        os.makedirs(self._originals, exist_ok=True)
+        os.makedirs(self._thumbs, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 2
+        self._executor = None
+        self._pending = {}  # photo id -> future of its thumbnail
+        self._lock = threading.RLock()  # done callbacks may run inside thumbnail_async
+
+    def _get_executor(self):
+        # Created on first use so importing a front end never starts threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbs')
+        return self._executor
+
+    # ---------------------- Originals ----------------------
+    def add(self, data):
+        """Store an uploaded photo (bytes) and return its id; raises ValueError if it is not an image."""
+        if len(data) > MAX_PHOTO_BYTES:
+            raise ValueError(f'Photo is larger than {MAX_PHOTO_BYTES // (1024 * 1024)} MB')
+        photo_id = hashlib.sha256(data).hexdigest()
+        if self.original_path(photo_id) is None:
+            from PIL import Image
+
+            try:
+                img = Image.open(io.BytesIO(data))
+            except Exception:
+                img = None
+            ext = FORMATS.get(img.format) if img is not None else None
+            if ext is None:
+                raise ValueError('Unsupported photo format, expected JPEG, PNG or WebP')
+            try:
+                # Decode it (at thumbnail scale where possible): open() only reads the
+                # header, and a truncated upload would fail every report using it
+                with img:
+                    img.draft('RGB', (THUMB_MAX_PX, THUMB_MAX_PX))
+                    img.load()
+            except Exception:
+                raise ValueError('Photo is damaged or incomplete') from None
+            write_report(data, self._originals, photo_id + ext)
+        self.thumbnail_async(photo_id)
+        return photo_id
+
+    def add_file(self, path):
+        with open(path, 'rb') as f:
+            return self.add(f.read())
+
+    def original_path(self, photo_id):
+        for ext in set(FORMATS.values()):
+            path = os.path.join(self._originals, photo_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def exists(self, photo_id):
+        return self.original_path(photo_id) is not None
+
+    # ---------------------- Thumbnails ----------------------
+    def _thumb_path(self, photo_id):
+        return os.path.join(self._thumbs, f'{photo_id}_{THUMB_MAX_PX}.jpg')
+
+    def _make_thumbnail(self, photo_id):
+        path = self._thumb_path(photo_id)
+        if not os.path.exists(path):
+            original = self.original_path(photo_id)
+            if original is None:
+                raise FileNotFoundError(f'No photo {photo_id}')
+            from PIL import Image, ImageOps
+
+            with Image.open(original) as img:
+                # Let the JPEG decoder skip detail we are about to throw away
+                img.draft('RGB', (THUMB_MAX_PX, THUMB_MAX_PX))
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((THUMB_MAX_PX, THUMB_MAX_PX), Image.LANCZOS)
+                buf = io.BytesIO()
+                img.convert('RGB').save(buf, 'JPEG', quality=THUMB_QUALITY, optimize=True)
+            write_report(buf.getvalue(), self._thumbs, os.path.basename(path))
+        return path
+
+    def thumbnail_async(self, photo_id):
+        """Future of the thumbnail path; the work is shared by concurrent callers."""
+        with self._lock:
+            future = self._pending.get(photo_id)
+            if future is None:
+                future = self._pending[photo_id] = self._get_executor().submit(self._make_thumbnail, photo_id)
+                future.add_done_callback(lambda f: self._forget(photo_id, f))
+            return future
+
+    def _forget(self, photo_id, future):
+        with self._lock:
+            if self._pending.get(photo_id) is future:
+                del self._pending[photo_id]
+
+    def put_thumbnail(self, photo_id, data):
+        """Install a ready-made print thumbnail, e.g. one read back from an archive."""
+        write_report(data, self._thumbs, os.path.basename(self._thumb_path(photo_id)))
+
+    def thumbnail(self, photo_id):
+        """Path of the print thumbnail, waiting for it if it is still being made; None if the photo is unknown."""
+        path = self._thumb_path(photo_id)
+        if os.path.exists(path):
+            return path
+        try:
+            return self.thumbnail_async(photo_id).result()
+        except FileNotFoundError:
+            return None
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_photo_store(directory=None):
+    """Return the process-wide photo store (PHOTOS_DIR by default)."""
+    directory = directory or PHOTOS_DIR
+    store = _stores.get(directory)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(directory)
+            if store is None:
+                store = _stores[directory] = PhotoStore(directory, PHOTO_WORKERS)
+    return store
@@ -0,0 +1,257 @@
+"""
+Compact archive of inspections with shared branding resources.
+
+Instead of keeping one PDF per inspection (each with its own copy of the
+logo and font data), an archive stores the inspection records themselves
+and every distinct branding (shop details, layout version and logo) once.
+PDFs are re-rendered from the archive when they are needed, exactly as they
+were branded when archived.
+
+Photos attached to the inspections are archived as the print thumbnails the
+reports embed (see photo_store.py), so an archive still exports complete
+reports once the photo store is gone. A photo that cannot be found when
+packing is left out with a warning, and exporting a report that refers to
+a photo the archive lacks (e.g. a format 1 archive) warns as well.
+
+Archive layout (a zip file):
+    manifest.json            format version, brandings, record and photo counts
+    assets/<sha256>.<ext>    logo files, stored once per distinct content
+    photos/<photo id>.jpg    print thumbnails of the photos, stored once each
+    records.jsonl            one record per line with its "branding" id
+
+Examples:
+ - python report_archive.py pack 2025-09.zip --db reports/inspections.db --from 2025-09-01 --to 2025-09-30
+ - python report_archive.py pack old.zip reports/            (CSV / JSON lines files)
+ - python report_archive.py list 2025-09.zip
+ - python report_archive.py export 2025-09.zip -o pdfs/ [--id 42 --id 43]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+from checklists import add_branding_arguments, branding_from_args
+from inspection import (add_date_range_arguments, date_range_from_args, read_record_file, record_from_dict,
+                        report_filename)
+from report_engine import LAYOUT_VERSION, get_renderer
+
+ARCHIVE_FORMAT = 2  # 2: photos
+
+
+class ArchiveWriter:
+    """Write records into a new archive; use as a context manager."""
+
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+        self._records = self._zip.open('records.jsonl', 'w', force_zip64=True)
+        self._brandings = {}  # branding tuple -> id
+        self._assets = {}  # name -> bytes, written once records.jsonl is closed
+        self._photos = {}  # photo id -> thumbnail path (None if missing), written on close like the logos
+        self._photo_store = None
+        self.count = 0
+        self.photos = 0  # photos archived, known once closed
+
+    def _branding_id(self, branding):
+        key = tuple(branding)
+        if key not in self._brandings:
+            shop_name, shop_address, shop_phone, logo_path = key
+            logo = None
+            if logo_path and os.path.exists(logo_path):
+                with open(logo_path, 'rb') as f:
+                    data = f.read()
+                logo = hashlib.sha256(data).hexdigest() + os.path.splitext(logo_path)[1].lower()
+                self._assets[logo] = data
+            self._brandings[key] = {
+                'id': len(self._brandings), 'shop_name': shop_name, 'shop_address': shop_address,
+                'shop_phone': shop_phone, 'logo': logo, 'layout_version': LAYOUT_VERSION,
+            }
+        return self._brandings[key]['id']
+
+    def _add_photos(self, record):
+        for item in record['items']:
+            for photo_id in item.get('photos') or ():
+                if photo_id in self._photos:
+                    continue
+                if self._photo_store is None:
+                    from photo_store import get_photo_store
+                    self._photo_store = get_photo_store()
+                path = self._photos[photo_id] = self._photo_store.thumbnail(photo_id)
+                if path is None:
+                    print(f"warning: photo {photo_id} of record {record.get('id', '-')} not found, "
+                          f"archived without it", file=sys.stderr)
+
+    def add(self, record, branding):
+        self._add_photos(record)
+        entry = dict(record, branding=self._branding_id(branding))
+        self._records.write((json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8'))
+        self.count += 1
+
+    def close(self):
+        self._records.close()
+        for name, data in self._assets.items():
+            # Already compressed images gain nothing from deflate
+            self._zip.writestr(f'assets/{name}', data, compress_type=zipfile.ZIP_STORED)
+        for photo_id, path in self._photos.items():
+            if path:
+                self._zip.write(path, f'photos/{photo_id}.jpg', compress_type=zipfile.ZIP_STORED)
+                self.photos += 1
+        manifest = {
+            'format': ARCHIVE_FORMAT,
+            'records': self.count,
+            'photos': self.photos,
+            'brandings': sorted(self._brandings.values(), key=lambda b: b['id']),
+        }
+        self._zip.writestr('manifest.json', json.dumps(manifest, indent=2))
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path)
+        self.manifest = json.loads(self._zip.read('manifest.json'))
+        if self.manifest['format'] > ARCHIVE_FORMAT:
+            raise ValueError(f"{path} uses archive format {self.manifest['format']}, "
+                             f"this version reads up to {ARCHIVE_FORMAT}")
+        self.brandings = {b['id']: b for b in self.manifest['brandings']}
+        self._photos = {name[len('photos/'):-len('.jpg')] for name in self._zip.namelist()
+                        if name.startswith('photos/')}
+        self._asset_dir = None
+        self._photo_store = None
+        self._extracted = set()  # photo ids installed in _photo_store
+
+    def __iter__(self):
+        """Yield (record, branding) pairs in archive order."""
+        with self._zip.open('records.jsonl') as f:
+            for line in f:
+                data = json.loads(line)
+                branding = self.brandings[data.pop('branding')]
+                record = record_from_dict(data)
+                if 'id' in data:
+                    record['id'] = data['id']
+                yield record, branding
+
+    def _extract_dir(self):
+        if self._asset_dir is None:
+            self._asset_dir = tempfile.TemporaryDirectory(prefix='ppi-archive-')
+        return self._asset_dir.name
+
+    def renderer_for(self, branding):
+        # Logos are extracted once to a temporary folder and shared by all renders
+        logo_path = None
+        if branding['logo']:
+            logo_path = os.path.join(self._extract_dir(), branding['logo'])
+            if not os.path.exists(logo_path):
+                with open(logo_path, 'wb') as f:
+                    f.write(self._zip.read(f"assets/{branding['logo']}"))
+        return get_renderer(branding['shop_name'], branding['shop_address'], branding['shop_phone'], logo_path)
+
+    def photo_store_for(self, record):
+        """Photo store holding the archived thumbnails of record's photos, and the ids the archive lacks."""
+        if self._photo_store is None:
+            from photo_store import PhotoStore
+            self._photo_store = PhotoStore(os.path.join(self._extract_dir(), 'photos'))
+        missing = []
+        for item in record['items']:
+            for photo_id in item.get('photos') or ():
+                if photo_id not in self._photos:
+                    missing.append(photo_id)
+                elif photo_id not in self._extracted:
+                    self._photo_store.put_thumbnail(photo_id, self._zip.read(f'photos/{photo_id}.jpg'))
+                    self._extracted.add(photo_id)
+        return self._photo_store, missing
+
+    def close(self):
+        self._zip.close()
+        if self._photo_store is not None:
+            self._photo_store.shutdown()
+        if self._asset_dir is not None:
+            self._asset_dir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_pdfs(archive_path, out_dir, ids=None):
+    """Render archived records (all, or those whose id is in ids) into out_dir; returns the count."""
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    with ArchiveReader(archive_path) as archive:
+        for record, branding in archive:
+            if ids is not None and record.get('id') not in ids:
+                continue
+            if branding['layout_version'] != LAYOUT_VERSION:
+                print(f"warning: record {record.get('id')} was archived with layout version "
+                      f"{branding['layout_version']}, rendering with {LAYOUT_VERSION}", file=sys.stderr)
+            photo_store, missing = archive.photo_store_for(record)
+            if missing:
+                print(f"warning: record {record.get('id', '-')} refers to {len(missing)} photo(s) the archive "
+                      f"does not contain, rendering without them", file=sys.stderr)
+            pdf = archive.renderer_for(branding).render(record, photo_store=photo_store)
+            pdf.output(os.path.join(out_dir, report_filename(record)))
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack inspections into a compact archive and export PDFs from it.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pack = sub.add_parser('pack', help='create an archive from the database or from CSV / JSON lines files')
+    pack.add_argument('archive')
+    pack.add_argument('inputs', nargs='*', help='CSV / JSON lines files or folders (instead of --db)')
+    pack.add_argument('--db', help='inspection database to archive from')
+    add_date_range_arguments(pack)
+    add_branding_arguments(pack)
+
+    lst = sub.add_parser('list', help='list archived inspections')
+    lst.add_argument('archive')
+
+    export = sub.add_parser('export', help='render PDFs from an archive')
+    export.add_argument('archive')
+    export.add_argument('-o', '--out', default='exported')
+    export.add_argument('--id', type=int, action='append', help='only export these record ids')
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        if bool(args.db) == bool(args.inputs):
+            parser.error('pack needs either --db or input files')
+        branding = branding_from_args(args)
+        with ArchiveWriter(args.archive) as writer:
+            if args.db:
+                from inspection_store import InspectionStore
+                date_from, date_to = date_range_from_args(args)
+                for record in InspectionStore(args.db).iter_records(date_from=date_from, date_to=date_to):
+                    writer.add(record, branding)
+            else:
+                from batch_render import iter_input_files
+                for path in iter_input_files(args.inputs):
+                    for record in read_record_file(path):
+                        writer.add(record, branding)
+        print(f'Archived {writer.count} inspection(s) and {writer.photos} photo(s) in {args.archive}'
+              f' ({os.path.getsize(args.archive)} bytes)')
+    elif args.command == 'list':
+        with ArchiveReader(args.archive) as archive:
+            for record, _ in archive:
+                print(f"{record.get('id', '-')}\t{record['date']}\t{record['client_name']}\t"
+                      f"{record['vehicle_model']}\t{record['vehicle_vin']}")
+    else:
+        count = export_pdfs(args.archive, args.out, set(args.id) if args.id else None)
+        print(f'Exported {count} PDF(s) to {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
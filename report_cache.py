@@ -0,0 +1,154 @@
+"""
+Content-addressed cache of rendered reports.
+
+The key is a hash of the whole inspection record, date and time included
+(see inspection.record_digest), plus the renderer's layout and branding
+version, so an identical submission returns the previously rendered PDF
+instead of running FPDF again. Entries live in a size-bounded in-memory
+LRU and, optionally, in a size-bounded directory on disk shared by all
+worker processes.
+
+The process-wide cache is configured from the environment:
+ - REPORT_CACHE_DIR        directory for the disk tier (unset: memory only)
+ - REPORT_CACHE_MEMORY_MB  memory tier size (default 64)
+ - REPORT_CACHE_DISK_MB    disk tier size (default 512)
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from inspection import record_digest
+from metrics import CACHE_LOOKUPS, timed
+from report_storage import write_report
+
+MB = 1024 * 1024
+
+
+def cache_key(renderer, record):
+    data = f'{record_digest(record)}|{renderer.version}'
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, directory=None, max_memory_bytes=64 * MB, max_disk_bytes=512 * MB):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> bytes, least recently used first
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pdf')
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            if key in self._disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        data = f.read()
+                    os.utime(self._path(key))
+                except OSError:
+                    # Removed by another process
+                    self._disk_bytes -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._remember(key, data)
+                    self.hits += 1
+                    return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+            if self.directory and key not in self._disk and len(data) <= self.max_disk_bytes:
+                write_report(data, self.directory, key + '.pdf')
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+                while self._disk_bytes > self.max_disk_bytes:
+                    old, size = self._disk.popitem(last=False)
+                    self._disk_bytes -= size
+                    try:
+                        os.remove(self._path(old))
+                    except OSError:
+                        pass
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    def render_bytes(self, renderer, record):
+        """Return the PDF for record, rendering it only on a cache miss."""
+        with timed('cache_lookup'):
+            key = cache_key(renderer, record)
+            data = self.get(key)
+        if data is None:
+            CACHE_LOOKUPS.inc(result='miss')
+            data = renderer.render_bytes(record)
+            with timed('cache_store'):
+                self.put(key, data)
+        else:
+            CACHE_LOOKUPS.inc(result='hit')
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in self._disk:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk.clear()
+            self._disk_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """Return the process-wide report cache, configured from the environment."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReportCache(
+                    directory=os.environ.get('REPORT_CACHE_DIR') or None,
+                    max_memory_bytes=int(os.environ.get('REPORT_CACHE_MEMORY_MB', '64')) * MB,
+                    max_disk_bytes=int(os.environ.get('REPORT_CACHE_DISK_MB', '512')) * MB,
+                )
+    return _cache
@@ -0,0 +1,457 @@
+"""
+Shared PDF rendering engine for inspection reports.
+
+The static parts of the layout (branding lines, font metrics, the checklist
+table header and the signature block) are prepared once per process by
+ReportRenderer. Rendering a report then only fills in the variable data of
+an inspection record (see inspection.py). Checklist rows are wrapped with
+the cached font metrics and split into pages before anything is drawn, so
+long notes are printed in full and the table header repeats on every page.
+
+The web form (app.py /generate) keeps its original one-page car inspection
+layout, CarReportRenderer; get_renderer(..., layout='car') returns one.
+
+Usage:
+    renderer = get_renderer(*template.branding)     # a checklists.py template
+    data = renderer.render_bytes(record)          # in memory
+    renderer.render(record).output('report.pdf')  # straight to a file
+"""
+
+import datetime
+import logging
+import os
+import threading
+
+from fpdf import FPDF
+
+from checklists import get_catalog
+from image_cache import place_image
+from inspection import final_total, record_datetime
+from metrics import REPORT_BYTES, REPORTS, timed
+
+# ---------------------- Static Layout ----------------------
+LAYOUT_VERSION = 4  # bump whenever the report layout changes; invalidates cached PDFs
+TITLE = 'Pre-Purchase Vehicle Inspection Report'
+TABLE_COLUMNS = (('Item', 90), ('Status', 24), ('Notes', 58), ('Est Cost', 18))
+SIGNATURE_LINE = 'Inspector Signature: ______________________         Client Signature: ______________________'
+FONT_FAMILY = 'Arial'
+FONT_STYLES = ('', 'B', 'I')
+TABLE_FONT_SIZE = 9
+TABLE_HEADER_HEIGHT = 6
+TABLE_LINE_HEIGHT = 4.5
+CELL_MARGIN = 1.0  # horizontal text inset, same as fpdf's default cell margin
+CELL_PADDING = 1.0  # extra row height around the text lines
+PHOTO_COLUMNS = 3
+PHOTO_GAP = 4
+PHOTO_MAX_HEIGHT = 80
+CAR_LAYOUT_VERSION = 1  # same for CarReportRenderer
+CAR_TITLE = 'Car Inspection Report'
+
+log = logging.getLogger(__name__)
+
+_fonts_loaded = False
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def _catalog():
+    # Reports still render (without category rows) where no template file is present
+    try:
+        return get_catalog()
+    except OSError:
+        return None
+
+
+def pdf_bytes(pdf):
+    """Return the finished document as bytes without touching the filesystem."""
+    out = pdf.output(dest='S')
+    if isinstance(out, str):
+        # fpdf 1.x returns the document as a latin-1 string
+        out = out.encode('latin-1')
+    return bytes(out)
+
+
+def preload_fonts():
+    # fpdf keeps core font metrics in a module level table, so loading them
+    # once here means no report pays for reading the metric files.
+    global _fonts_loaded
+    if _fonts_loaded:
+        return
+    pdf = FPDF()
+    for style in FONT_STYLES:
+        pdf.set_font(FONT_FAMILY, style, 10)
+    _fonts_loaded = True
+
+
+class TextMeasure:
+    """String widths and word wrapping from a core font's cached metrics."""
+
+    def __init__(self, family, style, size):
+        pdf = FPDF()
+        pdf.set_font(family, style, size)
+        self.char_widths = pdf.current_font['cw']
+        self.scale = pdf.font_size / 1000.0
+        self._words = {}
+        self.space = self.width(' ')
+
+    def width(self, text):
+        # Words repeat a lot across inspections, so their widths are memoised
+        w = self._words.get(text)
+        if w is None:
+            cw = self.char_widths
+            w = sum(cw.get(c, 0) for c in text) * self.scale
+            if len(self._words) < 20000:
+                self._words[text] = w
+        return w
+
+    def _split_word(self, word, width):
+        parts = []
+        start, used = 0, 0.0
+        for i, c in enumerate(word):
+            w = self.char_widths.get(c, 0) * self.scale
+            if used + w > width and i > start:
+                parts.append(word[start:i])
+                start, used = i, 0.0
+            used += w
+        parts.append(word[start:])
+        return parts
+
+    def wrap(self, text, width):
+        """Break text into lines no wider than width; always returns at least one line."""
+        lines = []
+        for paragraph in text.split('\n'):
+            line, used = [], 0.0
+            for word in paragraph.split():
+                w = self.width(word)
+                if w > width:
+                    *full, word = self._split_word(word, width)
+                    if line:
+                        lines.append(' '.join(line))
+                    lines.extend(full)
+                    line, used = [word], self.width(word)
+                elif line and used + self.space + w > width:
+                    lines.append(' '.join(line))
+                    line, used = [word], w
+                else:
+                    used += w + (self.space if line else 0.0)
+                    line.append(word)
+            lines.append(' '.join(line))
+        return lines
+
+
+# ---------------------- PDF Document ----------------------
+class InspectionPDF(FPDF):
+    def __init__(self, renderer, generated=None):
+        FPDF.__init__(self)
+        self.renderer = renderer
+        generated = generated or datetime.datetime.now()
+        self.generated_line = f'Report generated: {generated.strftime("%Y-%m-%d %H:%M")}'
+
+    def header(self):
+        r = self.renderer
+        if r.logo_path:
+            try:
+                with timed('logo'):
+                    place_image(self, r.logo_path, 10, 8, 30)
+            except Exception:
+                pass
+        self.set_font(FONT_FAMILY, 'B', 14)
+        self.cell(0, 6, r.shop_name, ln=True, align='R')
+        self.set_font(FONT_FAMILY, '', 9)
+        self.cell(0, 5, r.contact_line, ln=True, align='R')
+        self.ln(4)
+
+    def footer(self):
+        self.set_y(-20)
+        self.set_font(FONT_FAMILY, 'I', 8)
+        self.cell(0, 5, self.generated_line, ln=True, align='L')
+        self.cell(0, 5, self.renderer.thanks_line, ln=True, align='R')
+
+
+# ---------------------- Renderer ----------------------
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns if path else 0
+    except OSError:
+        return 0
+
+
+class BaseRenderer:
+    def render(self, record):
+        raise NotImplementedError
+
+    def render_bytes(self, record):
+        with timed('layout'):
+            pdf = self.render(record)
+        with timed('output'):
+            data = pdf_bytes(pdf)
+        REPORTS.inc()
+        REPORT_BYTES.inc(len(data))
+        return data
+
+
+class ReportRenderer(BaseRenderer):
+    def __init__(self, shop_name, shop_address, shop_phone='', logo_path=None):
+        self.shop_name = shop_name
+        self.logo_path = logo_path
+        self.contact_line = shop_address + (' | ' + shop_phone if shop_phone else '')
+        self.thanks_line = 'Thank you for choosing ' + shop_name
+        self.column_widths = tuple(w for _, w in TABLE_COLUMNS)
+        preload_fonts()
+        self.measure = TextMeasure(FONT_FAMILY, '', TABLE_FONT_SIZE)
+
+    @property
+    def version(self):
+        """Identifies the layout, branding, logo file and checklist templates a report is rendered with."""
+        return (f'{LAYOUT_VERSION}|{self.shop_name}|{self.contact_line}|{self.logo_path}|{_mtime(self.logo_path)}|'
+                f'{getattr(_catalog(), "digest", "")}')
+
+    def render(self, record, photo_store=None):
+        """Lay out a report for an inspection record and return the FPDF document.
+
+        Photos come from photo_store, by default the process-wide one.
+        """
+        pdf = InspectionPDF(self)
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+        body_top = pdf.get_y()  # the header leaves every page at the same height
+        pdf.set_font(FONT_FAMILY, 'B', 12)
+        pdf.cell(0, 8, TITLE, ln=True, align='C')
+        pdf.ln(4)
+
+        self._client_block(pdf, record)
+        if record['items']:
+            self._checklist_table(pdf, record, body_top)
+            pdf.ln(4)
+            pdf.set_font(FONT_FAMILY, 'B', 10)
+            pdf.cell(0, 6, f'Total Estimated Repair Cost: {final_total(record):.2f}', ln=1)
+            pdf.ln(4)
+
+        pdf.set_font(FONT_FAMILY, 'B', 10)
+        pdf.cell(0, 6, 'Summary / Notes:', ln=1)
+        pdf.set_font(FONT_FAMILY, '', 10)
+        pdf.multi_cell(0, 6, record['summary'] or 'No additional notes provided.')
+        pdf.ln(4)
+
+        if record['recommendation']:
+            pdf.set_font(FONT_FAMILY, 'B', 10)
+            pdf.cell(0, 6, 'Recommendation:', ln=1)
+            pdf.set_font(FONT_FAMILY, '', 10)
+            pdf.cell(0, 6, record['recommendation'], ln=1)
+
+        pdf.ln(12)
+        pdf.set_font(FONT_FAMILY, '', 10)
+        pdf.cell(0, 6, SIGNATURE_LINE, ln=1)
+
+        photo_items = [row for row in record['items'] if row.get('photos')]
+        if photo_items:
+            self._photos(pdf, photo_items, photo_store)
+        return pdf
+
+    def _client_block(self, pdf, record):
+        pdf.set_font(FONT_FAMILY, '', 10)
+        pdf.cell(40, 6, f"Client: {record['client_name']}", ln=0)
+        pdf.cell(0, 6, f"Date: {record_datetime(record).strftime('%Y-%m-%d')}", ln=1)
+        pdf.cell(40, 6, f"Phone: {record['client_phone']}", ln=0)
+        pdf.cell(0, 6, f"Inspector: {record['inspector']}", ln=1)
+        pdf.cell(80, 6, f"Vehicle: {record['vehicle_model']} ({record['vehicle_year']})", ln=1)
+        pdf.cell(0, 6, f"VIN/Reg: {record['vehicle_vin']}", ln=1)
+        pdf.ln(4)
+
+    def _row_lines(self, row):
+        measure = self.measure
+        return [measure.wrap(text, width - 2 * CELL_MARGIN) for text, width in zip(
+            (row['item'], row['status'], row['notes'], f"{row['cost']:.2f}"), self.column_widths)]
+
+    def _paginate(self, rows, first_space, page_space):
+        """Split wrapped rows into pages of rows that fit under a repeated header.
+
+        A row taller than a whole page is continued on the next page, and a
+        category row (a single column) is never left alone at the bottom.
+        """
+        page_lines = int((page_space - CELL_PADDING) // TABLE_LINE_HEIGHT)
+        pages, page, space = [], [], first_space
+        for cols in rows:
+            while cols:
+                needed = max(len(lines) for lines in cols)
+                fit = int((space - CELL_PADDING) // TABLE_LINE_HEIGHT)
+                if needed + (len(cols) == 1) <= fit:
+                    page.append(cols)
+                    space -= needed * TABLE_LINE_HEIGHT + CELL_PADDING
+                    break
+                if fit >= 1 and needed > page_lines:
+                    page.append([lines[:fit] for lines in cols])
+                    cols = [lines[fit:] for lines in cols]
+                pages.append(page)
+                page, space = [], page_space
+        pages.append(page)
+        return pages
+
+    def _table_header(self, pdf):
+        pdf.set_font(FONT_FAMILY, 'B', 10)
+        for label, width in TABLE_COLUMNS[:-1]:
+            pdf.cell(width, TABLE_HEADER_HEIGHT, label, border=1)
+        label, width = TABLE_COLUMNS[-1]
+        pdf.cell(width, TABLE_HEADER_HEIGHT, label, border=1, ln=1)
+        pdf.set_font(FONT_FAMILY, '', TABLE_FONT_SIZE)
+
+    def _checklist_table(self, pdf, record, body_top):
+        with timed('table_layout'):
+            # Items of a category of the record's own template are preceded by
+            # a row with its name; records without a known template get none
+            catalog = _catalog()
+            template = catalog.find(record.get('template')) if catalog else None
+            categories = {item: category.name for category in template.categories
+                          for item in category.items} if template else {}
+            rows, current = [], None
+            for row in record['items']:
+                category = categories.get(row['item'])
+                if category and category != current:
+                    rows.append([[category]])
+                current = category
+                rows.append(self._row_lines(row))
+            bottom = pdf.page_break_trigger
+            pages = self._paginate(rows, bottom - pdf.get_y() - TABLE_HEADER_HEIGHT,
+                                   bottom - body_top - TABLE_HEADER_HEIGHT)
+
+        # Vertical text position inside a line, as fpdf's cell() places it
+        baseline = CELL_PADDING / 2 + TABLE_LINE_HEIGHT / 2 + 0.3 * TABLE_FONT_SIZE / pdf.k
+        for n, page in enumerate(pages):
+            if n:
+                pdf.add_page()
+            if not page:
+                continue
+            self._table_header(pdf)
+            pdf.set_fill_color(235)
+            for cols in page:
+                x, y = pdf.l_margin, pdf.get_y()
+                if len(cols) == 1:
+                    height = TABLE_LINE_HEIGHT + CELL_PADDING
+                    pdf.set_font(FONT_FAMILY, 'B', TABLE_FONT_SIZE)
+                    pdf.rect(x, y, sum(self.column_widths), height, 'DF')
+                    pdf.text(x + CELL_MARGIN, y + baseline, cols[0][0])
+                    pdf.set_font(FONT_FAMILY, '', TABLE_FONT_SIZE)
+                    pdf.set_y(y + height)
+                    continue
+                height = max(len(lines) for lines in cols) * TABLE_LINE_HEIGHT + CELL_PADDING
+                for width, lines in zip(self.column_widths, cols):
+                    pdf.rect(x, y, width, height)
+                    for i, line in enumerate(lines):
+                        if line:
+                            pdf.text(x + CELL_MARGIN, y + baseline + i * TABLE_LINE_HEIGHT, line)
+                    x += width
+                pdf.set_y(y + height)
+
+    def _photos(self, pdf, items, store=None):
+        if store is None:
+            # Imported here so reports without photos do not need Pillow
+            from photo_store import get_photo_store
+
+            store = get_photo_store()
+        pdf.add_page()
+        pdf.set_font(FONT_FAMILY, 'B', 12)
+        pdf.cell(0, 8, 'Photos', ln=1)
+        column_w = (pdf.w - pdf.l_margin - pdf.r_margin - (PHOTO_COLUMNS - 1) * PHOTO_GAP) / PHOTO_COLUMNS
+        for row in items:
+            with timed('photos'):
+                paths = [p for p in (self._photo_image(pdf, store, photo_id) for photo_id in row['photos']) if p]
+            sizes = []
+            for path in paths:
+                info = pdf.images[path]
+                h = min(column_w * info['h'] / info['w'], PHOTO_MAX_HEIGHT)
+                sizes.append((h * info['w'] / info['h'], h))
+
+            for start in range(0, len(paths), PHOTO_COLUMNS):
+                row_h = max(h for _, h in sizes[start:start + PHOTO_COLUMNS])
+                caption_h = 8 if start == 0 else 0
+                if pdf.get_y() + caption_h + row_h > pdf.page_break_trigger:
+                    pdf.add_page()
+                if start == 0:
+                    pdf.set_font(FONT_FAMILY, 'B', 10)
+                    pdf.cell(0, 6, f"{row['item']} - {row['status']}", ln=1)
+                    pdf.ln(2)
+                x, y = pdf.l_margin, pdf.get_y()
+                for path, (w, h) in zip(paths[start:start + PHOTO_COLUMNS], sizes[start:start + PHOTO_COLUMNS]):
+                    pdf.image(path, x, y, w, h)
+                    x += column_w + PHOTO_GAP
+                pdf.set_y(y + row_h + PHOTO_GAP)
+
+    @staticmethod
+    def _photo_image(pdf, store, photo_id):
+        # Path of the photo's thumbnail, loaded into pdf.images; None (the photo
+        # is left out) if it is unknown or cannot be read, so the report still renders
+        try:
+            path = store.thumbnail(photo_id)
+            if path is not None and path not in pdf.images:
+                info = pdf._parsejpg(path)
+                info['i'] = len(pdf.images) + 1
+                pdf.images[path] = info
+        except Exception as e:
+            log.warning('Leaving photo %s out of the report: %s', photo_id, e)
+            return None
+        return path
+
+
+class CarReportRenderer(BaseRenderer):
+    """The web form's car inspection report: logo, client, car and notes on one page.
+
+    Only the logo of the branding is printed. The make is the record's
+    vehicle_make, which vehicle_model starts with; records without one are
+    split at the first space of vehicle_model.
+    """
+
+    def __init__(self, shop_name, shop_address, shop_phone='', logo_path=None):
+        self.logo_path = logo_path
+        preload_fonts()
+
+    @property
+    def version(self):
+        return f'car-{CAR_LAYOUT_VERSION}|{self.logo_path}|{_mtime(self.logo_path)}'
+
+    def render(self, record):
+        pdf = FPDF()
+        pdf.add_page()
+        if self.logo_path:
+            with timed('logo'):
+                place_image(pdf, self.logo_path, 10, 8, 33)
+
+        pdf.set_font(FONT_FAMILY, 'B', 16)
+        pdf.cell(80)  # move to the right
+        pdf.cell(30, 10, CAR_TITLE, 0, 1, 'C')
+        pdf.set_font(FONT_FAMILY, '', 12)
+        pdf.cell(0, 10, f"Date: {record_datetime(record).strftime('%Y-%m-%d %H:%M')}", ln=True)
+
+        make = record.get('vehicle_make')
+        if make and record['vehicle_model'].startswith(make + ' '):
+            model = record['vehicle_model'][len(make) + 1:]
+        else:
+            make, _, model = record['vehicle_model'].partition(' ')
+        sections = (('Client Information', (('Name', record['client_name']), ('Phone', record['client_phone']))),
+                    ('Car Information', (('Make', make), ('Model', model), ('Year', record['vehicle_year']))))
+        for heading, fields in sections:
+            pdf.set_font(FONT_FAMILY, 'B', 14)
+            pdf.cell(0, 10, heading, ln=True)
+            pdf.set_font(FONT_FAMILY, '', 12)
+            for label, value in fields:
+                pdf.cell(0, 10, f'{label}: {value}', ln=True)
+
+        pdf.set_font(FONT_FAMILY, 'B', 14)
+        pdf.cell(0, 10, 'Inspection Notes', ln=True)
+        pdf.set_font(FONT_FAMILY, '', 12)
+        pdf.multi_cell(0, 10, record['summary'])
+        return pdf
+
+
+LAYOUTS = {'ppi': ReportRenderer, 'car': CarReportRenderer}
+
+
+def get_renderer(shop_name, shop_address, shop_phone='', logo_path=None, layout='ppi'):
+    """Return the process-wide renderer for a shop's branding and layout, creating it on first use."""
+    key = (shop_name, shop_address, shop_phone, logo_path, layout)
+    renderer = _renderers.get(key)
+    if renderer is None:
+        with _renderers_lock:
+            renderer = _renderers.get(key)
+            if renderer is None:
+                renderer = _renderers[key] = LAYOUTS[layout](*key[:4])
+    return renderer
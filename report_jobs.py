@@ -0,0 +1,194 @@
+"""
+Background report generation queue.
+
+Reports are rendered by a pool of worker threads or processes so the web
+request that asked for a report only has to enqueue it and hand back a job
+id. Finished jobs are kept in memory for JOB_TTL seconds so the client can
+poll the status and download the PDF. A job's status is 'pending', 'done'
+or 'failed'.
+
+When several server processes answer requests (e.g. gunicorn workers), a
+deployment can opt in to a state_dir shared by all of them. Job markers and
+finished PDFs are then written there, so any process can report on any job,
+at the cost of a few disk writes per report. Without it, PDFs stay in memory.
+"""
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import concurrent.futures
+
+from metrics import REPORT_ERRORS, profiled
+from report_cache import get_report_cache
+from report_storage import write_report
+
+JOB_TTL = 15 * 60
+EXECUTORS = {'thread': 'ThreadPoolExecutor', 'process': 'ProcessPoolExecutor'}  # looked up on first use
+PRUNE_INTERVAL = 60.0  # seconds between sweeps for expired jobs
+
+
+def render_report(branding, record, profile_path=None, layout='ppi'):
+    # Module level so it can be sent to a process pool. The renderer (and fpdf)
+    # is imported with the first report rather than when the server starts.
+    from report_engine import get_renderer
+
+    try:
+        renderer = get_renderer(*branding, layout=layout)
+        if profile_path:
+            with profiled(profile_path):
+                return get_report_cache().render_bytes(renderer, record)
+        return get_report_cache().render_bytes(renderer, record)
+    except Exception:
+        REPORT_ERRORS.inc()
+        raise
+
+
+class ReportJob:
+    def __init__(self, job_id, filename, future):
+        self.id = job_id
+        self.filename = filename
+        self.future = future
+        self.created = time.time()
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return 'pending'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    @property
+    def result(self):
+        return self.future.result() if self.status == 'done' else None
+
+    def describe(self):
+        info = {'id': self.id, 'status': self.status, 'filename': self.filename}
+        if info['status'] == 'failed':
+            info['error'] = str(self.future.exception())
+        return info
+
+
+class StoredJob:
+    """A job submitted by another process, read back from the shared state_dir."""
+
+    def __init__(self, state_dir, job_id, filename):
+        self.id = job_id
+        self.filename = filename
+        self._base = os.path.join(state_dir, job_id)
+
+    @property
+    def status(self):
+        if os.path.exists(self._base + '.pdf'):
+            return 'done'
+        if os.path.exists(self._base + '.error'):
+            return 'failed'
+        return 'pending'
+
+    @property
+    def result(self):
+        try:
+            with open(self._base + '.pdf', 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def describe(self):
+        info = {'id': self.id, 'status': self.status, 'filename': self.filename}
+        if info['status'] == 'failed':
+            with open(self._base + '.error', encoding='utf-8') as f:
+                info['error'] = f.read()
+        return info
+
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ReportJobQueue:
+    def __init__(self, workers=4, kind='thread', ttl=JOB_TTL, state_dir=None):
+        if kind not in EXECUTORS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {sorted(EXECUTORS)}")
+        self.workers = workers
+        self.kind = kind
+        self.ttl = ttl
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def _get_executor(self):
+        # Created on first use so importing the app never forks workers
+        if self._executor is None:
+            self._executor = getattr(concurrent.futures, EXECUTORS[self.kind])(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, branding, record, filename, on_done=None, profile_path=None, layout='ppi'):
+        """Queue a report and return its ReportJob. on_done(job) runs once the PDF is ready.
+
+        With profile_path the rendering is run under cProfile and the stats written there.
+        layout picks the report_engine layout ('ppi' or 'car').
+        """
+        now = time.monotonic()
+        with self._lock:
+            future = self._get_executor().submit(render_report, branding, record, profile_path, layout)
+            job = ReportJob(uuid.uuid4().hex, filename, future)
+            self._jobs[job.id] = job
+            prune = now - self._pruned >= PRUNE_INTERVAL
+            if prune:
+                self._pruned = now
+        if prune:
+            self._prune()
+        if self.state_dir:
+            write_report(json.dumps({'filename': filename}).encode('utf-8'), self.state_dir, job.id + '.json')
+            future.add_done_callback(lambda f: self._save_state(job))
+        if on_done is not None:
+            future.add_done_callback(lambda f: f.exception() is None and on_done(job))
+        return job
+
+    def render_many(self, branding, records):
+        """Render records on the worker pool and return their PDFs in order (blocks until done)."""
+        chunksize = 1 if self.kind == 'thread' else max(1, len(records) // (self.workers * 4))
+        return list(self._get_executor().map(render_report, itertools.repeat(branding), records,
+                                             chunksize=chunksize))
+
+    def _save_state(self, job):
+        exc = job.future.exception()
+        if exc is None:
+            write_report(job.future.result(), self.state_dir, job.id + '.pdf')
+        else:
+            write_report(str(exc).encode('utf-8'), self.state_dir, job.id + '.error')
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None and self.state_dir and _JOB_ID_RE.match(job_id):
+            try:
+                with open(os.path.join(self.state_dir, job_id + '.json'), encoding='utf-8') as f:
+                    job = StoredJob(self.state_dir, job_id, json.load(f)['filename'])
+            except (OSError, ValueError, KeyError):
+                return None
+        return job
+
+    def _prune(self):
+        # At most once per PRUNE_INTERVAL; only the dict update holds the lock
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [k for k, job in self._jobs.items() if job.created < cutoff and job.future.done()]
+            for k in expired:
+                del self._jobs[k]
+        if self.state_dir:
+            for entry in os.scandir(self.state_dir):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,50 @@
+"""
+Optional on-disk archiving of generated reports.
+
+Reports are built and served from memory; keeping a copy under the reports
+folder is a side step handled by a single background writer thread so the
+request that produced the PDF never waits on the filesystem.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-archive')
+    return _executor
+
+
+def write_report(data, directory, filename):
+    """Write report bytes to directory/filename atomically and return the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    tmp = path + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        log.error('Archiving report failed: %s', exc)
+
+
+def archive_async(data, directory, filename):
+    """Queue report bytes to be written in the background; returns a Future for the path."""
+    future = _get_executor().submit(write_report, data, directory, filename)
+    future.add_done_callback(_log_failure)
+    return future
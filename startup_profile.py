@@ -0,0 +1,102 @@
+"""
+Cold-start timing of the entry points.
+
+Each entry point is imported in a fresh interpreter under `python -X
+importtime`, the way a new container or a newly forked server first loads
+it, and the slowest modules are listed with their own and cumulative
+import times. Modules that should only be loaded on first use (fpdf,
+Pillow, NumPy, csv, zipfile) are flagged when one of this project's modules
+imports them at startup; with --check that makes the exit status non-zero,
+so it can guard a build. (The interpreter and third-party packages may load
+some of them for their own use; that is not flagged.)
+
+Examples:
+ - python startup_profile.py                  # all entry points
+ - python startup_profile.py app --top 30
+ - python startup_profile.py --check
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = {'app': 'app', 'main': 'main', 'desktop': 'Test-2'}  # name -> module
+LAZY_MODULES = ('fpdf', 'PIL', 'numpy', 'csv', 'zipfile')
+
+# Imports the module and prints how long that took; main.py runs in Streamlit's bare mode
+_SNIPPET = ('import importlib, time; t = time.perf_counter(); importlib.import_module({module!r}); '
+            'print(time.perf_counter() - t)')
+
+
+def measure(module, runs=3):
+    """Import module in `runs` fresh interpreters.
+
+    Returns the median import time in seconds and the (name, self us,
+    cumulative us, depth) of every module loaded in the last run, in the
+    order importtime reports them: each module after the ones it imported.
+    """
+    totals, timings = [], None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _SNIPPET.format(module=module)],
+                              capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError(f'importing {module} failed:\n{proc.stderr}')
+        totals.append(float(proc.stdout.strip().splitlines()[-1]))
+        timings = []
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+            timings.append((name.strip(), int(own), int(cumulative), depth))
+    return statistics.median(totals), timings
+
+
+def eager_imports(timings):
+    """Lazily loaded modules that one of this project's modules imported directly."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    project = {os.path.splitext(f)[0] for f in os.listdir(here) if f.endswith('.py')}
+    found = set()
+    parents = []
+    # Walked backwards every module comes before the ones it imported
+    for name, _, _, depth in reversed(timings):
+        del parents[depth:]
+        if name in LAZY_MODULES and depth and parents[-1] in project:
+            found.add(name)
+        parents.append(name)
+    return [m for m in LAZY_MODULES if m in found]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report the import time of the entry points, per module.')
+    parser.add_argument('entry_points', nargs='*', metavar='ENTRY_POINT',
+                        help=f"one of {', '.join(ENTRY_POINTS)} (default: all)")
+    parser.add_argument('--top', type=int, default=15, help='modules to list per entry point')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per entry point')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 if a lazily loaded module is imported at startup')
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.entry_points) - set(ENTRY_POINTS))
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}")
+
+    failed = False
+    for name in args.entry_points or ENTRY_POINTS:
+        module = ENTRY_POINTS[name]
+        total, timings = measure(module, args.runs)
+        print(f'\n{name} ({module}.py): {total * 1000:.0f} ms to import')
+        print(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for mod, own, cumulative, _ in sorted(timings, key=lambda t: -t[1])[:args.top]:
+            print(f'{own / 1000:9.1f} {cumulative / 1000:9.1f}  {mod}')
+        eager = eager_imports(timings)
+        if eager:
+            failed = True
+            print(f"Loaded at startup but expected on first use: {', '.join(eager)}")
+    return 1 if failed and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
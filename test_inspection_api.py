@@ -0,0 +1,60 @@
+import pytest
+
+import app as flask_app
+from inspection import validate_record_dict
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(flask_app, 'INSPECTIONS_DB', str(tmp_path / 'inspections.db'))
+    return flask_app.app.test_client()
+
+
+@pytest.mark.parametrize('body', [
+    '{"client_name": "a", "vehicle_model": "b", "total_cost": NaN}',
+    '{"client_name": "a", "vehicle_model": "b", "total_cost": Infinity}',
+    '{"client_name": "a", "vehicle_model": "b", "items": [{"item": "x", "status": "Pass", "cost": -Infinity}]}',
+])
+def test_non_finite_costs_are_rejected(client, body):
+    response = client.post('/api/inspections?render=none', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert 'must be a finite number' in response.get_json()['errors'][0]['errors'][0]
+
+
+def test_finite_costs_are_accepted():
+    assert validate_record_dict({'client_name': 'a', 'vehicle_model': 'b', 'total_cost': 12.5,
+                                 'items': [{'item': 'x', 'status': 'Pass', 'cost': 3}]}) == []
+
+
+def test_inspections_keep_their_template(client):
+    body = ('[{"client_name": "a", "vehicle_model": "b", "template": "car@1"},'
+            ' {"client_name": "c", "vehicle_model": "d"}]')
+    response = client.post('/api/inspections?render=none&template=motorbike', data=body,
+                           content_type='application/json')
+    assert response.status_code == 201
+    store = flask_app.get_store(flask_app.INSPECTIONS_DB)
+    ids = [result['id'] for result in response.get_json()['results']]
+    assert [store.get(i)['template'] for i in ids] == ['car@1', 'motorbike@1']
+
+
+def test_repeated_idempotency_key_replays_the_first_answer(client):
+    body = '{"client_name": "a", "vehicle_model": "b"}'
+    headers = {'Idempotency-Key': 'test-replay'}
+    first = client.post('/api/inspections?render=none', data=body, content_type='application/json', headers=headers)
+    again = client.post('/api/inspections?render=none', data=body, content_type='application/json', headers=headers)
+    assert first.status_code == again.status_code == 201
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert again.get_json() == first.get_json()
+
+
+@pytest.mark.parametrize('path', ['/generate', '/generate/jobs'])
+def test_form_errors(client, path):
+    form = {'client_name': 'a', 'client_phone': '1', 'car_make': 'Land Rover', 'car_model': 'Defender',
+            'car_year': '2020', 'inspection_notes': ''}
+    unknown = client.post(path, data=dict(form, template='nope'))
+    assert unknown.status_code == 400
+    assert 'nope' in unknown.get_json()['error']
+    del form['client_phone']
+    missing = client.post(path, data=form)
+    assert missing.status_code == 400
+    assert missing.get_json(silent=True) is None  # Flask's own Bad Request page
@@ -0,0 +1,33 @@
+"""
+Production WSGI entry point for the Flask app.
+
+Run with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The checklist templates, renderers, font metrics and logos are loaded here, at import time, so that
+with preload_app the gunicorn master builds them once and forked workers
+share them copy-on-write instead of each loading their own copy.
+
+Set PRELOAD_RENDERERS=0 to skip that and start serving sooner (e.g. on a
+platform that scales out by starting single-worker containers); the first
+report in each worker then loads them instead.
+"""
+
+import os
+
+from app import app
+from checklists import get_catalog
+
+
+def preload():
+    from image_cache import load_image
+    from report_engine import get_renderer
+
+    for branding in get_catalog().brandings.values():
+        get_renderer(*branding)
+        if branding.logo_path:
+            load_image(branding.logo_path)
+
+
+if os.environ.get('PRELOAD_RENDERERS', '1') == '1':
+    preload()